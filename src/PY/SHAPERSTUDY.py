@@ -22,20 +22,83 @@ from salome.kernel import SHAPERSTUDY_ORB
 from salome.kernel import SALOME_ComponentPy
 from salome.kernel import SALOME_DriverPy
 from salome.kernel import SALOMEDS
-from SHAPERSTUDY_utils import findOrCreateComponent, moduleName, getStudy, getORB
+from SHAPERSTUDY_utils import findOrCreateComponent, moduleName, getStudy, getORB, getServant
 from salome.kernel import salome
 import SHAPERSTUDY_Object
 import SHAPERSTUDY_IOperations
+import SHAPERSTUDY_Persistence
 from salome.kernel import GEOM
 from salome.kernel import SMESH
 
 import StudyData_Swig
 
+import io
+import os
+
 # for unit tests correct execution
 salome.salome_init(embedded=True)
 
 __entry2IOR__ = {}
 __entry2DumpName__ = {}
+# reverse index of __entry2DumpName__: dump name -> number of entries with this name
+__dumpNames__ = {}
+# base name -> the first suffix that may be free for this name in UniqueDumpName
+__dumpNameSuffix__ = {}
+# XAO archives exported by the python dump: file name -> (content key, modification time)
+__dumpArchives__ = {}
+# number of the current study, increased when a new study is started or loaded
+__studyNumber__ = 0
+
+def newStudy():
+  """
+  Forgets data of the previous study kept by the module: entries and exported archives
+  """
+  global __studyNumber__
+  __studyNumber__ += 1
+  __entry2IOR__.clear()
+  __dumpArchives__.clear()
+
+def setDumpName(theEntry, theName):
+  """
+  Stores theName of theEntry in __entry2DumpName__, keeping the index of used names
+  """
+  anOldName = __entry2DumpName__.get(theEntry)
+  if anOldName is not None:
+    __dumpNames__[anOldName] -= 1
+    if __dumpNames__[anOldName] == 0:
+      del __dumpNames__[anOldName]
+      __dumpNameSuffix__.clear() # a suffix became free, so the search starts from the first one
+  __entry2DumpName__[theEntry] = theName
+  __dumpNames__[theName] = __dumpNames__.get(theName, 0) + 1
+
+def resetDumpNames(theEntry2DumpName):
+  """
+  Replaces all dump names by theEntry2DumpName and rebuilds the index of used names
+  """
+  global __entry2DumpName__
+  __entry2DumpName__ = theEntry2DumpName
+  __dumpNames__.clear()
+  __dumpNameSuffix__.clear()
+  for aName in __entry2DumpName__.values():
+    __dumpNames__[aName] = __dumpNames__.get(aName, 0) + 1
+
+def uniqueDumpName(theBaseName, theID):
+  """
+  Returns a unique dump name from theBaseName for theID and stores it in __entry2DumpName__
+  """
+  # to avoid spaces and parenthesis in the variable name
+  aBaseName = theBaseName.replace(" ", "_").replace("(", "").replace(")", "")
+  aName = aBaseName
+  if aName in __dumpNames__:
+    # names with smaller suffixes are already used, since names are only added until reset
+    aPrefix = __dumpNameSuffix__.get(aBaseName, 1)
+    aName = aBaseName + "_" + str(aPrefix)
+    while aName in __dumpNames__:
+      aPrefix = aPrefix + 1
+      aName = aBaseName + "_" + str(aPrefix)
+    __dumpNameSuffix__[aBaseName] = aPrefix + 1
+  setDumpName(theID, aName)
+  return aName
 
 class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_ComponentPy_i, SALOME_DriverPy.SALOME_DriverPy_i):
 
@@ -81,18 +144,14 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
         """
         Searches existing or creates a new SHAPERSTUDY_Object to interact with SHAPER
         """
-        # Searching in the study tree
-        aComponent = findOrCreateComponent()
-        aSOIter = getStudy().NewChildIterator(aComponent)
-        while aSOIter.More():
-          aSO = aSOIter.Value()
-          anIOR = aSO.GetIOR()
-          if len(anIOR):
-            anObj = salome.orb.string_to_object(anIOR)
-            if anObj and isinstance(anObj, SHAPERSTUDY_ORB._objref_SHAPER_Object):
-              if anObj.GetEntry() == theInternalEntry:
-                return anObj
-          aSOIter.Next()
+        findOrCreateComponent() # to load the SHAPER-STUDY data if it is not done yet
+        # Searching in the index of published objects
+        aShape = SHAPERSTUDY_Object.__entry2Object__.get(theInternalEntry)
+        if aShape and type(aShape) == SHAPERSTUDY_Object.SHAPERSTUDY_Object and \
+           aShape.GetEntry() == theInternalEntry and not aShape.IsDead():
+          anObj = aShape._this()
+          if getStudy().FindObjectIOR(salome.orb.object_to_string(anObj)): # published in this study
+            return anObj
         aShapeObj = SHAPERSTUDY_Object.SHAPERSTUDY_Object()
         aShapeObj.SetEntry(theInternalEntry)
         return aShapeObj._this()
@@ -138,6 +197,9 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
             anIOR = salome.orb.object_to_string(theObject)
             aResultSO.SetAttrString("AttributeIOR", anIOR)
             theObject.SetSO(aResultSO)
+            aServant = getServant(theObject)
+            if aServant:
+              SHAPERSTUDY_Object.__entry2Object__[theObject.GetEntry()] = aServant
             aAttr = aBuilder.FindOrCreateAttribute(aResultSO, "AttributePixMap")
             aPixmap = aAttr._narrow(salome.SALOMEDS.AttributePixMap)
             aType = 0
@@ -185,7 +247,7 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
         """
         Stores the variable names of the SHAPER dump to python
         """
-        __entry2DumpName__["s" + theEntry] = theVarName
+        setDumpName("s" + theEntry, theVarName)
 
 
     def AddSubShape( theMainShape, theIndices ):
@@ -237,79 +299,120 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
 
     def Save( self, component, URL, isMultiFile ):
         """
-        Saves data: all objects into one file
+        Saves data: all objects into one file, or each object into a separate file
+        in the multi-file mode
         """
-        aResult = "" # string-pairs of internal entries and shape streams
         aStudy = getStudy()
-        # get all sub-SObjects with IOR defined
+        # get all objects published in the sub-SObjects
         anIters = [aStudy.NewChildIterator(findOrCreateComponent())]
-        aSOList = []
+        anObjList = []
         while len(anIters):
           aLast = anIters[len(anIters) - 1]
           if aLast.More():
             aSO = aLast.Value()
-            anIOR = aSO.GetIOR()
-            if len(anIOR):
-              aSOList.append(aSO)
+            anObj = SHAPERSTUDY_Object.findObject(aSO)
+            if anObj:
+              anObjList.append(anObj)
             anIters.append(aStudy.NewChildIterator(aSO))
             aLast.Next()
           else:
             anIters.remove(aLast)
 
-        for aSO in aSOList: # for each sobject export shapes stream if exists
-          anIOR = aSO.GetIOR()
-          if not len(anIOR):
-            continue
-          anObj = salome.orb.string_to_object(anIOR)
-          if type(anObj) == SHAPERSTUDY_ORB._objref_SHAPER_Group:
-            if len(aResult):
-              aResult += '|'
-            # store internal entry, type and list of indices of the group selection (separated by spaces)
-            aResult += anObj.GetEntry() + "|" + str(anObj.GetSelectionType())
-            aSelList = anObj.GetSelection()
-            aResult += "|" + str(' '.join(str(anI) for anI in aSelList))
-            aSelListOld = anObj.GetSelectionOld()
-            aResult += ";" + str(' '.join(str(anI) for anI in aSelListOld))
-          elif type(anObj) == SHAPERSTUDY_ORB._objref_SHAPER_Field:
-            if len(aResult):
-              aResult += '|'
-            # same as for group, but in addition to the second string part - field specifics
-            aResult += anObj.GetEntry() + "|" + str(anObj.GetSelectionType())
-            aResult += " " + str(anObj.GetDataType()) # values type
-            aSteps = anObj.GetSteps()
-            aResult += " " + str(len(aSteps)) # number of steps
-            aComps = anObj.GetComponents()
-            aResult += " " + str(len(aComps)) # number of components
-            for aComp in aComps: # components strings: but before remove spaces and '|'
-              aCoded = aComp.replace(" ", "__space__").replace("|", "__vertical_bar__")
-              aResult += " " + aCoded
-            for aStepNum in range(len(aSteps)):
-              aVals = anObj.GetStep(aStepNum + 1).GetValues()
-              if aStepNum == 0:
-                aResult += " " + str(len(aVals)) # first the number of values in the step
-              aResult += " " + str(anObj.GetStep(aStepNum + 1).GetStamp()) # ID of stamp in step
-              for aVal in aVals:
-                aResult += " " + str(aVal) # all values of step
-            aSelList = anObj.GetSelection()
-            aResult += "|" + str(' '.join(str(anI) for anI in aSelList))
-            aSelListOld = anObj.GetSelectionOld()
-            aResult += ";" + str(' '.join(str(anI) for anI in aSelListOld))
-          elif isinstance(anObj, SHAPERSTUDY_ORB._objref_SHAPER_Object):
-            if len(aResult):
-              aResult += '|'
-            # store internal entry + tick, current and old shapes in BRep format
-            aResult += anObj.GetEntry() + " " + str(anObj.GetTick())
-            aResult += "|" + anObj.GetShapeStream().decode()
-            aResult += "|" + anObj.GetOldShapeStream().decode()
-
-        return aResult.encode()
+        # records are written one by one, in the multi-file mode each one into a separate file
+        # in the directory given by URL (the study may be not saved yet, so its URL is not used)
+        aSink = io.BytesIO()
+        if isMultiFile:
+          aWriter = SHAPERSTUDY_Persistence.Writer(aSink, URL, moduleName() + "_")
+        else:
+          aWriter = SHAPERSTUDY_Persistence.Writer(aSink)
+        for anObj in anObjList: # export data of each SHAPER-STUDY object
+          if isinstance(anObj, SHAPERSTUDY_Object.SHAPERSTUDY_Field):
+            # same as for group, but in addition - field specifics
+            aSteps = []
+            for aStepID in anObj.GetSteps():
+              aStep = anObj.getStepData(aStepID)
+              aSteps.append((aStepID, aStep.GetStamp(), aStep.values))
+            aWriter.AddField(anObj.GetEntry(), anObj.GetSelectionType(), anObj.GetValuesType(),
+                             anObj.GetComponents(), aSteps, anObj.GetSelection(), anObj.GetSelectionOld())
+          elif isinstance(anObj, SHAPERSTUDY_Object.SHAPERSTUDY_Group):
+            # store internal entry, type and list of indices of the group selection
+            aWriter.AddGroup(anObj.GetEntry(), anObj.GetSelectionType(),
+                             anObj.GetSelection(), anObj.GetSelectionOld())
+          elif isinstance(anObj, SHAPERSTUDY_Object.SHAPERSTUDY_Object):
+            # store internal entry, tick, current and old shapes in OCCT binary BRep format
+            # (the same shape versions of different objects are stored once)
+            aStream = anOldStream = b''
+            if anObj.data:
+              aStream = anObj.data.shapeBinStream()
+              anOldStream = anObj.data.oldShapeBinStream()
+            aWriter.AddShape(anObj.GetEntry(), anObj.GetTick(), aStream, anOldStream)
+
+        aWriter.Close()
+        return aSink.getvalue()
 
     def Load( self, component, stream, URL, isMultiFile ):
         """
         Loads data
         """
+        newStudy()
+        SHAPERSTUDY_Object.__entry2Object__.clear()
+        SHAPERSTUDY_Object.__so2Object__.clear()
+        if not SHAPERSTUDY_Persistence.isBinary(stream):
+          return self.LoadOldFormat(stream)
+        try:
+          aReader = SHAPERSTUDY_Persistence.Reader(stream, URL if isMultiFile else None)
+        except ValueError as anError:
+          print("Error of SHAPER-STUDY data load: " + str(anError))
+          return 0
+        aBlobs = {} # shapes streams by keys, shared by objects
+        for aKind, anEntry, aRecord in aReader.Records():
+          if aKind == SHAPERSTUDY_Persistence.BLOB:
+            aBlobs[anEntry] = SHAPERSTUDY_Persistence.readBlob(aRecord)
+            continue
+          elif aKind == SHAPERSTUDY_Persistence.SHAPE:
+            aTick, aStream, anOldStream = \
+              SHAPERSTUDY_Persistence.readShape(aRecord, aBlobs)
+            anObj = SHAPERSTUDY_Object.SHAPERSTUDY_Object()
+            anObj.SetShapeByBinStream(aStream, anOldStream)
+            anObj.SetTick(aTick)
+          elif aKind == SHAPERSTUDY_Persistence.GROUP:
+            aSelType, aSelection, aSelectionOld = SHAPERSTUDY_Persistence.readGroup(aRecord)
+            anObj = SHAPERSTUDY_Object.SHAPERSTUDY_Group()
+            anObj.SetSelection(list(aSelectionOld)) # old selection
+            anObj.SetSelection(list(aSelection))
+            anObj.SetSelectionType(aSelType)
+          elif aKind == SHAPERSTUDY_Persistence.FIELD:
+            aSelType, aValType, aComps, aSteps, aSelection, aSelectionOld = \
+              SHAPERSTUDY_Persistence.readField(aRecord)
+            anObj = SHAPERSTUDY_Object.SHAPERSTUDY_Field()
+            anObj.SetSelection(list(aSelectionOld)) # old selection
+            anObj.SetSelection(list(aSelection))
+            anObj.SetSelectionType(aSelType)
+            anObj.SetValuesType(aValType)
+            anObj.SetComponents(aComps)
+            anObj.SetSteps([aStepID for aStepID, aStampID, aValues in aSteps])
+            for aStepID, aStampID, aValues in aSteps:
+              anObj.AddFieldStep(aStampID, aStepID, aValues)
+            anObj.SetTick(-3)
+          else:
+            continue # unknown kind of record
+          anObj.SetEntry(anEntry)
+          anIOR = salome.orb.object_to_string(anObj._this())
+          __entry2IOR__[anEntry] = anIOR
+          SHAPERSTUDY_Object.__entry2Object__[anEntry] = anObj
+        # shapes are read on demand; they may be read in parallel just after loading if the
+        # SHAPERSTUDY_READ_THREADS variable defines the number of threads (negative for all cores)
+        aThreads = os.getenv("SHAPERSTUDY_READ_THREADS")
+        if aThreads and aThreads.lstrip("-").isdigit():
+          StudyData_Swig.StudyData_Object.SetReadThreads(int(aThreads))
+        StudyData_Swig.StudyData_Object.ReadShapes()
+        return 1
+
+    def LoadOldFormat( self, stream ):
+        """
+        An internal method for loading data saved in the old text format
+        """
         global __entry2IOR__
-        __entry2IOR__.clear()
         aList=stream.decode().split('|')
         aSubNum = 1
         anId = ""
@@ -366,7 +469,11 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
                 aStampId = int(aParams[aStepStartIndex])
                 aVals = []
                 for aValIndex in range(aNumValsInStep):
-                  aVals.append(float(aParams[aStepStartIndex + aValIndex + 1]))
+                  aVal = aParams[aStepStartIndex + aValIndex + 1]
+                  if anObj.GetValuesType() == 3: # string
+                    aVals.append(aVal.replace("__space__", " ").replace("__vertical_bar__", "|"))
+                  else:
+                    aVals.append(float(aVal))
                 anObj.AddFieldStep(aStampId, aStepNum + 1, aVals)
               anObj.SetTick(-3)
             else: # shape object by BRep in the stream: set old first then new
@@ -381,6 +488,7 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
                 anObj.SetTick(int(anEntryAndTick[1]))
               anIOR = salome.orb.object_to_string(anObj._this())
               __entry2IOR__[anEntryAndTick[0]] = anIOR
+              SHAPERSTUDY_Object.__entry2Object__[anEntryAndTick[0]] = anObj
             aSubNum = 1
         return 1
         
@@ -412,22 +520,23 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
                  anObj.SetTick(anFatherObj.GetTick())
           return aRes
         return ""
+
+    def Close( self, component ):
+        """
+        Called when the study is closed: data of the closed study is not used any more
+        """
+        newStudy()
+        resetDumpNames({})
+        SHAPERSTUDY_Object.__entry2Object__.clear()
+        SHAPERSTUDY_Object.__so2Object__.clear()
+        SALOME_DriverPy.SALOME_DriverPy_i.Close(self, component)
     
     def UniqueDumpName( self, theBaseName, theID ):
         """
         Returns a unique name from the theBaseName. Keeps theBaseName if it was not used yet.
         Stores the newly generated name into the global map __entry2DumpName__.
         """
-        global __entry2DumpName__
-        aPrefix = 1
-        # to avoid spaces and parenthesis in the variable name
-        aBaseName = theBaseName.replace(" ", "_").replace("(", "").replace(")", "")
-        aName = aBaseName
-        while aName in __entry2DumpName__.values():
-          aName = aBaseName + "_" + str(aPrefix)
-          aPrefix = aPrefix + 1
-        __entry2DumpName__[theID] = aName
-        return aName
+        return uniqueDumpName(theBaseName, theID)
 
     def GetShaperEntry(self, theShapeObj):
         """
@@ -445,42 +554,48 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
 
     def OrderGroups(self, theStudy, theStartSO, theIsGroup):
         """
-        An internal method for returning sub-groups or sub-fields in a correct order basing on their IDs
+        An internal method for returning sub-groups or sub-fields servants in a correct order basing on their IDs
+        """
+        aGroups, aFields = self.OrderGroupsAndFields(theStudy, theStartSO)
+        return aGroups if theIsGroup else aFields
+
+    def OrderGroupsAndFields(self, theStudy, theStartSO):
+        """
+        An internal method for returning sub-groups and sub-fields servants in a correct order
+        basing on their IDs, both lists are collected in one iteration of children
         """
-        aResult = []
         anIter = theStudy.NewChildIterator(theStartSO)
-        anOrder = {} # entry to object
+        aGroupsOrder = {} # entry to object
+        aFieldsOrder = {}
         while anIter.More():
           anSO = anIter.Value()
           anIter.Next()
-          anIOR = anSO.GetIOR()
-          if len(anIOR):
-            anObj = salome.orb.string_to_object(anIOR)
-            if (theIsGroup and isinstance(anObj, SHAPERSTUDY_ORB._objref_SHAPER_Group)) or \
-               (not theIsGroup and isinstance(anObj, SHAPERSTUDY_ORB._objref_SHAPER_Field)):
-              anEntry = anObj.GetEntry()
-              aSplit = anEntry.split(":")
-              if len(aSplit) > 1 and aSplit[1].isdecimal():
-                anID = int(aSplit[1])
-                anOrder[anID] = anObj
-
-        for aKey in sorted(anOrder.keys()):
-          aResult.append(anOrder[aKey])
-
-        return aResult
+          anObj = SHAPERSTUDY_Object.findObject(anSO)
+          if isinstance(anObj, SHAPERSTUDY_Object.SHAPERSTUDY_Group): # fields are groups too
+            anEntry = anObj.GetEntry()
+            aSplit = anEntry.split(":")
+            if len(aSplit) > 1 and aSplit[1].isdecimal():
+              anID = int(aSplit[1])
+              if isinstance(anObj, SHAPERSTUDY_Object.SHAPERSTUDY_Field):
+                aFieldsOrder[anID] = anObj
+              else:
+                aGroupsOrder[anID] = anObj
+
+        aGroups = [aGroupsOrder[aKey] for aKey in sorted(aGroupsOrder.keys())]
+        aFields = [aFieldsOrder[aKey] for aKey in sorted(aFieldsOrder.keys())]
+        return aGroups, aFields
 
 
     def DumpPython( self, isPublished, isMultiFile ):
         """
         Dump module data to the Python script.
         """
-        global __entry2DumpName__
         # remove all non-SHAPER entries
         aCopyMap = {}
         for anEntry in __entry2DumpName__:
           if anEntry.startswith("s"):
             aCopyMap[anEntry] = __entry2DumpName__[anEntry]
-        __entry2DumpName__ = aCopyMap
+        resetDumpNames(aCopyMap)
 
         anArchiveNum = 1
         # collect all shape-objects in the SHAPERSTUDY tree
@@ -488,12 +603,9 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
         aStudy = getStudy()
         aRoots = aStudy.NewChildIterator(findOrCreateComponent())
         while aRoots.More():
-          aSO = aRoots.Value()
-          anIOR = aSO.GetIOR()
-          if len(anIOR):
-            anObj = salome.orb.string_to_object(anIOR)
-            if anObj and type(anObj) == SHAPERSTUDY_ORB._objref_SHAPER_Object:
-              aShapeObjects.append(anObj)
+          anObj = SHAPERSTUDY_Object.findObject(aRoots.Value())
+          if type(anObj) == SHAPERSTUDY_Object.SHAPERSTUDY_Object:
+            aShapeObjects.append(anObj)
           aRoots.Next()
         script = []
         if len(aShapeObjects):
@@ -514,8 +626,7 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
 
           for aShapeObj in aShapeObjects:
             # check this shape also has sub-groups and fields
-            anOrderedGroups = self.OrderGroups(aStudy, aShapeObj.GetSO(), True)
-            anOrderedFields = self.OrderGroups(aStudy, aShapeObj.GetSO(), False)
+            anOrderedGroups, anOrderedFields = self.OrderGroupsAndFields(aStudy, aShapeObj.GetSO())
             anObjects = anOrderedGroups + anOrderedFields
 
             aGroupVarNames = []
@@ -544,48 +655,38 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
               aDeads = aStudy.NewChildIterator(aHistSO)
               while aDeads.More():
                 aDSO = aDeads.Value()
-                aDIOR = aDSO.GetIOR()
-                if len(aDIOR):
-                  aDeadShape = salome.orb.string_to_object(aDIOR)
-                  if aDeadShape and type(aDeadShape) == SHAPERSTUDY_ORB._objref_SHAPER_Object:
-                    aDeadString = ""
-                    aXAO = StudyData_Swig.StudyData_XAO()
-                    aXAO.SetShape(aDeadShape.getShape())
-                    anArchiveName = "archive_" + str(anArchiveNum) + ".xao"
-                    if len(aStudy.GetDumpPath()):
-                      anArchiveName = aStudy.GetDumpPath() + "/" + anArchiveName
-                    anArchiveNum += 1
-                    aDeadVarName = self.UniqueDumpName(aDeadShape.GetName(), aDSO.GetID())
-                    aDeadString += aDeadVarName + ", "
-
-                    aGroups = self.OrderGroups(aStudy, aDSO, True)
-                    for aDeadGroup in aGroups:
-                      aDGroupVarName = self.UniqueDumpName(aDeadGroup.GetName(), aDeadGroup.GetSO().GetID())
-                      aDeadString += aDGroupVarName + ", "
-                      aGroupID = aXAO.AddGroup(aDeadGroup.GetSelectionType(), aDGroupVarName)
-                      for aSel in aDeadGroup.GetSelection():
-                        aXAO.AddGroupSelection(aGroupID, aSel)
-
-                    aFields = self.OrderGroups(aStudy, aDSO, False)
-                    for aDeadField in aFields:
-                      aDFieldVarName = self.UniqueDumpName(aDeadField.GetName(), aDeadField.GetSO().GetID())
-                      aDeadString += aDFieldVarName + ", "
-                      aComponents = aDeadField.GetComponents()
-                      aFieldID = aXAO.AddField(aDeadField.GetValuesType(), aDeadField.GetSelectionType(), \
-                        len(aComponents), aDFieldVarName)
-                      for aCompIndex in range(len(aComponents)):
-                        aXAO.SetFieldComponent(aFieldID, aCompIndex, aComponents[aCompIndex])
-                      aSteps = aDeadField.GetSteps()
-                      for aStep in aSteps:
-                        aFieldStep = aDeadField.GetStep(aStep)
-                        aXAO.AddStep(aFieldID, aStep, aFieldStep.GetStamp())
-                        aStepVals = aFieldStep.GetValues()
-                        for aValue in aStepVals:
-                          aXAO.AddStepValue(aFieldID, aStep, str(aValue))
-
-                    aXAO.Export(anArchiveName)
-                    aDeadString += " = SHAPERSTUDY.archive(" + aShapeVar + ", \"" + anArchiveName + "\")"
-                    script.append("  " + aDeadString) if isMultiFile else script.append("aDeadString")
+                aDeadShape = SHAPERSTUDY_Object.findObject(aDSO)
+                if type(aDeadShape) == SHAPERSTUDY_Object.SHAPERSTUDY_Object:
+                  anArchiveName = "archive_" + str(anArchiveNum) + ".xao"
+                  if len(aStudy.GetDumpPath()):
+                    anArchiveName = aStudy.GetDumpPath() + "/" + anArchiveName
+                  anArchiveNum += 1
+                  aDeadVarName = self.UniqueDumpName(aDeadShape.GetName(), aDSO.GetID())
+                  aDeadString = aDeadVarName + ", "
+
+                  aGroups, aFields = self.OrderGroupsAndFields(aStudy, aDSO)
+                  aGroupNames = []
+                  for aDeadGroup in aGroups:
+                    aGroupNames.append(self.UniqueDumpName(aDeadGroup.GetName(), aDeadGroup.GetSO().GetID()))
+                  aFieldNames = []
+                  for aDeadField in aFields:
+                    aFieldNames.append(self.UniqueDumpName(aDeadField.GetName(), aDeadField.GetSO().GetID()))
+                  for aName in aGroupNames + aFieldNames:
+                    aDeadString += aName + ", "
+
+                  # the archive is exported again only if its content is changed (dead objects may be
+                  # changed by import of an archive) or the file is changed or not there (other path)
+                  aKey = (__studyNumber__, aDSO.GetID(),
+                          archiveContent(aDeadShape, aGroups, aGroupNames, aFields, aFieldNames))
+                  anExported = __dumpArchives__.get(anArchiveName)
+                  if not anExported or anExported[0] != aKey or not os.path.isfile(anArchiveName) or \
+                     os.path.getmtime(anArchiveName) != anExported[1]:
+                    exportArchive(aDeadShape, aGroups, aGroupNames, aFields, aFieldNames, anArchiveName)
+                    if os.path.isfile(anArchiveName):
+                      __dumpArchives__[anArchiveName] = (aKey, os.path.getmtime(anArchiveName))
+
+                  aDeadString += " = SHAPERSTUDY.archive(" + aShapeVar + ", \"" + anArchiveName + "\")"
+                  script.append("  " + aDeadString) if isMultiFile else script.append("aDeadString")
                 aDeads.Next()
           pass
         
@@ -621,35 +722,43 @@ class SHAPERSTUDY_Gen(SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_Compon
         """
         Breaks links to not-dead shape, make the shape as dead
         """
-        aStudy = getStudy()
-        aSO = aStudy.FindObjectID(theEntry)
-        if not aSO:
-          return
-        aRes, aSSO = aSO.ReferencedObject()
-        if not aRes:
-          return # only SObjects referenced to the SHAPER STUDY objects are allowed
-        anIOR = aSSO.GetIOR()
-        if not anIOR:
-          return # must be referenced to the SHAPER STUDY shape
-        anObj = salome.orb.string_to_object(anIOR)
-        if not anObj or not isinstance(anObj, SHAPERSTUDY_ORB._objref_SHAPER_Object):
-          return
-        if anObj.IsDead():
-          return # do nothing for reference to already dead shape
-        aDeadShape = anObj.MakeDead()
-        
-        aMeshSObject = aSO.GetFather()
-        aMeshObject = aMeshSObject.GetObject()
+        self.BreakLinks([theEntry])
 
+    def BreakLinks(self, theEntries):
+        """
+        Breaks links of all theEntries to not-dead shapes, makes these shapes dead. A shape
+        referenced by several meshes is made dead once and the dead shape is shared by them.
+        """
+        aStudy = getStudy()
         aBuilder = aStudy.NewBuilder()
-        aBuilder.RemoveReference(aSO) # reset reference to the dead shape
-        aBuilder.Addreference(aSO, aDeadShape.GetSO())
-
-        # check also sub-structure of the mesh to find references to sub-objects that become dead
-        breakLinkForSubElements(aSO, aDeadShape)
-
-        # Replace shape object in the parent mesh
-        aMeshObject.ReplaceShape(aDeadShape)
+        aDeadShapes = {} # SObject ID of the referenced shape -> its dead shape
+        aReferences = [] # pairs of SObject referenced to the shape under the mesh and dead shape
+        for anEntry in theEntries:
+          aSO = aStudy.FindObjectID(anEntry)
+          if not aSO:
+            continue
+          aRes, aSSO = aSO.ReferencedObject()
+          if not aRes:
+            continue # only SObjects referenced to the SHAPER STUDY objects are allowed
+          aDeadShape = aDeadShapes.get(aSSO.GetID())
+          if aDeadShape is None:
+            anObj = SHAPERSTUDY_Object.findObject(aSSO)
+            if anObj is None:
+              continue # must be referenced to the SHAPER STUDY shape
+            if anObj.IsDead():
+              continue # do nothing for reference to already dead shape
+            aDeadShape = anObj.MakeDead()
+            aDeadShapes[aSSO.GetID()] = aDeadShape
+          aBuilder.RemoveReference(aSO) # reset reference to the dead shape
+          aBuilder.Addreference(aSO, aDeadShape.GetSO())
+          aReferences.append((aSO, aDeadShape))
+
+        # check also sub-structures of meshes to find references to sub-objects that become dead
+        breakLinkForSubElements(aReferences)
+
+        for aSO, aDeadShape in aReferences:
+          # Replace shape object in the parent mesh
+          aSO.GetFather().GetObject().ReplaceShape(aDeadShape)
 
 def shape(theEntry):
   """
@@ -659,23 +768,17 @@ def shape(theEntry):
   aRoots = aStudy.NewChildIterator(findOrCreateComponent())
   while aRoots.More():
     aSO = aRoots.Value()
-    anIOR = aSO.GetIOR()
-    if len(anIOR):
-      anObj = salome.orb.string_to_object(anIOR)
-      if anObj and type(anObj) == SHAPERSTUDY_ORB._objref_SHAPER_Object and anObj.GetEntry() == theEntry:
-        aRes = (anObj,)
-        # add groups and fields to the result
-        aSOIter = aStudy.NewChildIterator(aSO)
-        while aSOIter.More():
-          aGroupSO = aSOIter.Value()
-          anIOR = aGroupSO.GetIOR()
-          if len(anIOR):
-            aGroup = salome.orb.string_to_object(anIOR)
-            if isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Group) or \
-               isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Field):
-              aRes = aRes + (aGroup,)
-          aSOIter.Next()
-        return aRes
+    anObj = SHAPERSTUDY_Object.findObject(aSO)
+    if type(anObj) == SHAPERSTUDY_Object.SHAPERSTUDY_Object and anObj.GetEntry() == theEntry:
+      aRes = (anObj._this(),)
+      # add groups and fields to the result
+      aSOIter = aStudy.NewChildIterator(aSO)
+      while aSOIter.More():
+        aGroup = SHAPERSTUDY_Object.findObject(aSOIter.Value())
+        if isinstance(aGroup, SHAPERSTUDY_Object.SHAPERSTUDY_Group): # fields are groups too
+          aRes = aRes + (aGroup._this(),)
+        aSOIter.Next()
+      return aRes
     aRoots.Next()
   return None # not found
 
@@ -692,7 +795,7 @@ def archive(theShape, theXAOFile):
     aLastDeadSO = aDeads.Value()
     aDeads.Next()
 
-  aDShape = aLastDeadSO.GetObject()
+  aDShape = SHAPERSTUDY_Object.findObject(aLastDeadSO)
   if aDShape:
     aXAO = StudyData_Swig.StudyData_XAO()
     anError = aXAO.Import(theXAOFile)
@@ -700,110 +803,169 @@ def archive(theShape, theXAOFile):
       print("Error of XAO file import: " + anError)
       return None
     aDShape.SetShapeByPointer(aXAO.GetShape())
-    aRes = (aDShape,)
+    aRes = (aDShape._this(),)
     # add groups and fields to the result
     aGroupIndex = 0
     aFieldIndex = 0
     aSOIter = aStudy.NewChildIterator(aLastDeadSO)
     while aSOIter.More():
-      aGroupSO = aSOIter.Value()
-      anIOR = aGroupSO.GetIOR()
-      if len(anIOR):
-        aGroup = salome.orb.string_to_object(anIOR)
-        if isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Group):
-          aRes += (aGroup,)
-          aGroup.SetSelectionType(aXAO.GetGroupDimension(aGroupIndex))
-          aSelection = []
-          for aSel in aXAO.GetGroupSelection(aGroupIndex):
-            aSelection.append(aSel)
-          aGroup.SetSelection(aSelection)
-          aGroupIndex += 1
-        elif isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Field):
-          aField = aGroup
-          aRes += (aField,)
-          aValType = aXAO.GetValuesType(aFieldIndex)
-          aField.SetValuesType(aValType)
-          aField.SetSelectionType(aXAO.GetSelectionType(aFieldIndex))
-          aCompNames = []
-          for aCompName in aXAO.GetComponents(aFieldIndex):
-            aCompNames.append(aCompName)
-          aField.SetComponents(aCompNames)
-          aField.ClearFieldSteps()
-          aXAO.BeginSteps(aFieldIndex)
-          while aXAO.More(aFieldIndex):
-            aValsList = []
-            for aVal in aXAO.GetValues():
-              if aValType == 0: # boolean
-                aValsList.append(int(aVal))
-              elif aValType == 1: # int
-                aValsList.append(int(aVal))
-              elif aValType == 2: # double
-                aValsList.append(float(aVal))
-            aField.AddFieldStep(aXAO.GetStamp(), aXAO.GetStepIndex(), aValsList)
-            aXAO.Next()
-          aFieldIndex += 1
+      aGroup = SHAPERSTUDY_Object.findObject(aSOIter.Value())
+      if isinstance(aGroup, SHAPERSTUDY_Object.SHAPERSTUDY_Field): # check first: fields are groups too
+        aField = aGroup
+        aRes += (aField._this(),)
+        aValType = aXAO.GetValuesType(aFieldIndex)
+        aField.SetValuesType(aValType)
+        aField.SetSelectionType(aXAO.GetSelectionType(aFieldIndex))
+        aCompNames = []
+        for aCompName in aXAO.GetComponents(aFieldIndex):
+          aCompNames.append(aCompName)
+        aField.SetComponents(aCompNames)
+        aField.ClearFieldSteps()
+        aXAO.BeginSteps(aFieldIndex)
+        while aXAO.More(aFieldIndex):
+          aValsList = []
+          for aVal in aXAO.GetValues():
+            if aValType == 0: # boolean
+              aValsList.append(int(aVal))
+            elif aValType == 1: # int
+              aValsList.append(int(aVal))
+            elif aValType == 2: # double
+              aValsList.append(float(aVal))
+            elif aValType == 3: # string
+              aValsList.append(aVal)
+          aField.AddFieldStep(aXAO.GetStamp(), aXAO.GetStepIndex(), aValsList)
+          aXAO.Next()
+        aFieldIndex += 1
+      elif isinstance(aGroup, SHAPERSTUDY_Object.SHAPERSTUDY_Group):
+        aRes += (aGroup._this(),)
+        aGroup.SetSelectionType(aXAO.GetGroupDimension(aGroupIndex))
+        aSelection = []
+        for aSel in aXAO.GetGroupSelection(aGroupIndex):
+          aSelection.append(aSel)
+        aGroup.SetSelection(aSelection)
+        aGroupIndex += 1
       aSOIter.Next()
     return aRes
   return None # not found
 
-def isFather(theFather, theChild):
-    """
-    Returns true if theChild SObject is a child of theFather SObject
-    """
-    aChild = theChild.GetFather()
-    while aChild.Depth() > theFather.Depth():
-      aChild = aChild.GetFather()
-    return aChild.GetID() == theFather.GetID()
-
-def breakLinkForSubElements(theMainShapeSO, theDeadShape):
+def archiveContent(theShape, theGroups, theGroupNames, theFields, theFieldNames):
+  """
+  Returns a tuple of all data exported by exportArchive with the same arguments, to compare
+  with the data of the archive exported before. Values of field steps are never modified,
+  they are replaced, so they are compared by identity unless they are replaced.
+  """
+  aGroups = tuple((aName, aGroup.GetSelectionType(), tuple(aGroup.GetSelection()))
+                  for aGroup, aName in zip(theGroups, theGroupNames))
+  aFields = []
+  for aField, aName in zip(theFields, theFieldNames):
+    aSteps = []
+    for aStep in aField.GetSteps():
+      aFieldStep = aField.getStepData(aStep)
+      aSteps.append((aStep, aFieldStep.GetStamp(), aFieldStep.values))
+    aFields.append((aName, aField.GetValuesType(), aField.GetSelectionType(),
+                    tuple(aField.GetComponents()), tuple(aSteps)))
+  return (theShape.GetTick(), aGroups, tuple(aFields))
+
+def exportArchive(theShape, theGroups, theGroupNames, theFields, theFieldNames, theFileName):
+  """
+  Exports the dead theShape with its groups and fields (published in the python dump with
+  theGroupNames and theFieldNames) to the XAO archive theFileName
+  """
+  aXAO = StudyData_Swig.StudyData_XAO()
+  aXAO.SetShape(theShape.getShape())
+  for aDeadGroup, aDGroupVarName in zip(theGroups, theGroupNames):
+    aGroupID = aXAO.AddGroup(aDeadGroup.GetSelectionType(), aDGroupVarName)
+    for aSel in aDeadGroup.GetSelection():
+      aXAO.AddGroupSelection(aGroupID, aSel)
+
+  for aDeadField, aDFieldVarName in zip(theFields, theFieldNames):
+    aComponents = aDeadField.GetComponents()
+    aFieldID = aXAO.AddField(aDeadField.GetValuesType(), aDeadField.GetSelectionType(), \
+      len(aComponents), aDFieldVarName)
+    for aCompIndex in range(len(aComponents)):
+      aXAO.SetFieldComponent(aFieldID, aCompIndex, aComponents[aCompIndex])
+    aSteps = aDeadField.GetSteps()
+    for aStep in aSteps:
+      aFieldStep = aDeadField.getStepData(aStep)
+      aXAO.AddStep(aFieldID, aStep, aFieldStep.GetStamp())
+      aStepVals = aFieldStep.values
+      for aValue in aStepVals:
+        aXAO.AddStepValue(aFieldID, aStep, str(aValue))
+
+  aXAO.Export(theFileName)
+
+def entryAncestors(theEntry):
+  """
+  Returns the list of entries of all fathers of the SObject by theEntry, nearest first.
+  Study entries are hierarchical, so fathers are found without study requests.
+  """
+  aRes = []
+  anEnd = theEntry.rfind(":")
+  while anEnd > 0:
+    aRes.append(theEntry[:anEnd])
+    anEnd = theEntry.rfind(":", 0, anEnd)
+  return aRes
+
+def breakLinkForSubElements(theReferences):
   """
-  Checks sub-structure of the SMESH-mesh to find references to sub-objects that become dead.
-  theMainShapeSO is SObject with reference to real SHAPERSTUDY shape, located under the Mesh node.
-  theDeadShape is a newly created dead shape instance
+  Checks sub-structures of SMESH-meshes to find references to sub-objects that become dead.
+  theReferences is a list of pairs: SObject with reference to real SHAPERSTUDY shape, located under
+  the Mesh node, and a newly created dead shape instance. Each mesh sub-tree is traversed once.
   """
   aStudy = getStudy()
   aBuilder = aStudy.NewBuilder()
-  aRoot = theMainShapeSO.GetFather()
-  anIters = [aStudy.NewChildIterator(aRoot)]
-  aSubList = []
-  anOriginShapeSO = theDeadShape.GetSO().GetFather().GetFather()
-  while len(anIters):
-    aLast = anIters[len(anIters) - 1]
-    if aLast.More():
-      aSub = aLast.Value()
+  aMeshes = {} # mesh SObject ID -> [mesh SObject, origin shape SObject ID -> dead shape]
+  for aMainShapeSO, aDeadShape in theReferences:
+    aRoot = aMainShapeSO.GetFather()
+    aMesh = aMeshes.setdefault(aRoot.GetID(), [aRoot, {}])
+    aMesh[1][aDeadShape.GetSO().GetFather().GetFather().GetID()] = aDeadShape
+  aSubList = [] # sub-objects SObjects of meshes with their origin shape SObject ID and dead shape
+  for aRoot, aShapes in aMeshes.values():
+    anIter = aStudy.NewChildIterator(aRoot)
+    anIter.InitEx(True) # all levels of the mesh sub-tree
+    while anIter.More():
+      aSub = anIter.Value()
       aRes, aSubRef = aSub.ReferencedObject()
-      if aRes and isFather(anOriginShapeSO, aSubRef):
-        aReferenced = aSubRef.GetObject()
-        if aReferenced and not aReferenced.IsDead():
-          aSubList.append(aSub)
-      anIters.append(aStudy.NewChildIterator(aSub))
-      aLast.Next()
-    else:
-      anIters.remove(aLast)
-  if len(aSubList):
-    # associate the number of sub-objects of the referenced objects
-    aMapSubEntryToIndex = {}
-    aSSOIter = aStudy.NewChildIterator(anOriginShapeSO)
-    anIndex = 1
-    while aSSOIter.More():
-      aSub = aSSOIter.Value()
-      if aSub.GetIOR():
-        aMapSubEntryToIndex[aSub.GetID()] = anIndex
-        anIndex = anIndex + 1
-      aSSOIter.Next()
-    for aSubSO in aSubList:
-      aRes, aSubRef = aSubSO.ReferencedObject()
-      if aRes and aSubRef.GetID() in aMapSubEntryToIndex:
-        anIndex = aMapSubEntryToIndex[aSubRef.GetID()]
-        aDeadIter = aStudy.NewChildIterator(theDeadShape.GetSO())
-        while aDeadIter.More(): # iterate dead subs to find object with the same index
-          aDeadSubSO = aDeadIter.Value()
-          if aDeadSubSO.GetIOR():
-            anIndex = anIndex - 1
-            if anIndex == 0:
-              aBuilder.RemoveReference(aSubSO) # reset reference to the dead shape
-              aBuilder.Addreference(aSubSO, aDeadSubSO)
-          aDeadIter.Next()
+      if aRes:
+        for anAncestor in entryAncestors(aSubRef.GetID()):
+          if anAncestor in aShapes:
+            aReferenced = aSubRef.GetObject()
+            if aReferenced and not aReferenced.IsDead():
+              aSubList.append((aSub, aSubRef.GetID(), anAncestor, aShapes[anAncestor]))
+            break
+      anIter.Next()
+  # associate the number of sub-objects of the referenced objects, once for each origin shape,
+  # and dead sub-objects by these numbers, once for each dead shape
+  aMapsSubEntryToIndex = {}
+  aDeadSubsLists = {}
+  for aSubSO, aSubRefID, anOriginShapeID, aDeadShape in aSubList:
+    aMapSubEntryToIndex = aMapsSubEntryToIndex.get(anOriginShapeID)
+    if aMapSubEntryToIndex is None:
+      aMapSubEntryToIndex = {}
+      aSSOIter = aStudy.NewChildIterator(aStudy.FindObjectID(anOriginShapeID))
+      while aSSOIter.More():
+        aSub = aSSOIter.Value()
+        if aSub.GetIOR():
+          aMapSubEntryToIndex[aSub.GetID()] = len(aMapSubEntryToIndex)
+        aSSOIter.Next()
+      aMapsSubEntryToIndex[anOriginShapeID] = aMapSubEntryToIndex
+    anIndex = aMapSubEntryToIndex.get(aSubRefID)
+    if anIndex is None:
+      continue
+    aDeadSO = aDeadShape.GetSO()
+    aDeadSubs = aDeadSubsLists.get(aDeadSO.GetID())
+    if aDeadSubs is None:
+      aDeadSubs = []
+      aDeadIter = aStudy.NewChildIterator(aDeadSO)
+      while aDeadIter.More():
+        aDeadSubSO = aDeadIter.Value()
+        if aDeadSubSO.GetIOR():
+          aDeadSubs.append(aDeadSubSO)
+        aDeadIter.Next()
+      aDeadSubsLists[aDeadSO.GetID()] = aDeadSubs
+    if anIndex < len(aDeadSubs): # dead sub-object with the same index
+      aBuilder.RemoveReference(aSubSO) # reset reference to the dead shape
+      aBuilder.Addreference(aSubSO, aDeadSubs[anIndex])
   pass
 
 class SHAPERSTUDY(SHAPERSTUDY_Gen, SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.SALOME_ComponentPy_i, SALOME_DriverPy.SALOME_DriverPy_i):
@@ -818,9 +980,10 @@ class SHAPERSTUDY(SHAPERSTUDY_Gen, SHAPERSTUDY_ORB__POA.Gen, SALOME_ComponentPy.
         Engines::EngineComponent CORBA interface - SALOME component) and SALOME_DriverPy_i
         (implementation of SALOMEDS::Driver CORBA interface - SALOME module's engine).
         """
-        global __entry2IOR__, __entry2DumpName__
-        __entry2IOR__.clear()
-        __entry2DumpName__.clear()
+        newStudy()
+        resetDumpNames({})
+        SHAPERSTUDY_Object.__entry2Object__.clear()
+        SHAPERSTUDY_Object.__so2Object__.clear()
         SALOME_ComponentPy.SALOME_ComponentPy_i.__init__(self, orb, poa, contID, containerName, instanceName, interfaceName, False)
         SALOME_DriverPy.SALOME_DriverPy_i.__init__(self, interfaceName)
         pass
@@ -830,9 +993,10 @@ class SHAPERSTUDY_No_Session(SHAPERSTUDY_Gen, SHAPERSTUDY_ORB__POA.Gen, SALOME_C
     Implementation without naming_service server.
     """
     def __init__ ( self, orb, poa, contID, containerName, instanceName, interfaceName ):
-        global __entry2IOR__, __entry2DumpName__
-        __entry2IOR__.clear()
-        __entry2DumpName__.clear()
+        newStudy()
+        resetDumpNames({})
+        SHAPERSTUDY_Object.__entry2Object__.clear()
+        SHAPERSTUDY_Object.__so2Object__.clear()
         SALOME_ComponentPy.SALOME_ComponentPy_Gen_i.__init__(self, orb, poa, contID, containerName, instanceName, interfaceName, False)
         SALOME_DriverPy.SALOME_DriverPy_i.__init__(self, interfaceName)
         pass
@@ -22,7 +22,7 @@ from salome.kernel import SHAPERSTUDY_ORB
 import SHAPERSTUDY_Object
 from salome.kernel import GEOM
 from salome.kernel import salome
-from SHAPERSTUDY_utils import getStudy
+from SHAPERSTUDY_utils import getStudy, getLocal
 
 import StudyData_Swig
 
@@ -48,7 +48,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
             isSorted If this parameter is TRUE, sub-shapes will be
             sorted by coordinates of their gravity centers.
         """
-        aList = self.myop.GetAllSubShapesIDs(theShape.getShape(), theShapeType, isSorted)
+        aList = self.myop.GetAllSubShapesIDs(getLocal(theShape).getShape(), theShapeType, isSorted)
         self.done = True
         aResult = []
         for i in aList:
@@ -64,7 +64,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
             theShape2 Shape to find shared sub-shapes with.
             theShapeType Type of sub-shapes to be retrieved.
         """
-        aList = self.myop.GetSharedShapes(theShape1.getShape(), theShape2.getShape(), theShapeType)
+        aList = self.myop.GetSharedShapes(getLocal(theShape1).getShape(), getLocal(theShape2).getShape(), theShapeType)
         self.done = True
         aResult = []
         for i in aList:
@@ -75,15 +75,33 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
         """
         Get global index of theSubShape in theMainShape.
         """
-        anIndex = self.myop.GetSubShapeIndex(theMainShape.getShape(), theSubShape.getShape())
+        anIndex = self.myop.GetSubShapeIndex(getLocal(theMainShape).getShape(), getLocal(theSubShape).getShape())
         self.done = True
         return anIndex
 
+    def GetSubShapeIndices( self, theMainShape, theSubShapes ):
+        """
+        Get global indices of theSubShapes in theMainShape, computed at once.
+        Zero is returned for a shape that is not a sub-shape of theMainShape.
+        """
+        aShapes = StudyData_Swig.PtrsList()
+        for aSubShape in theSubShapes:
+          aShapes.append(getLocal(aSubShape).getShape())
+        aList = self.myop.GetSubShapeIndices(getLocal(theMainShape).getShape(), aShapes)
+        self.done = True
+        return list(aList)
+
+    def GetSubShapesIndices( self, theMainShape, theSubShapes ):
+        """
+        Get global indices of theSubShapes in theMainShape (same as GetSubShapeIndices).
+        """
+        return self.GetSubShapeIndices(theMainShape, theSubShapes)
+
     def GetSubShape( self, theMainShape, theID ):
         """
         Get a sub-shape defined by its unique ID within theMainShape
         """
-        aShape = self.myop.GetSubShape(theMainShape.getShape(), theID)
+        aShape = self.myop.GetSubShape(getLocal(theMainShape).getShape(), theID)
         self.done = aShape != 0
         if not self.done:
           return None
@@ -105,11 +123,12 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
         Returns:
             List of sub-shapes of type aType, contained in aShape.
         """
-        shapes = self.myop.ExtractSubShapes( aShape.getShape(), aType, isSorted )
+        shapes = self.myop.ExtractSubShapes( getLocal(aShape).getShape(), aType, isSorted )
+        # shapes found by the explorer (with their orientations), the sorted list is cached
+        # by the main shape version; data objects of sub-shapes are created on demand
         resultList = []
         for s in shapes:
-            aShapeObj = SHAPERSTUDY_Object.SHAPERSTUDY_Object()
-            aShapeObj.SetShapeByPointer( s )
+            aShapeObj = SHAPERSTUDY_Object.SHAPERSTUDY_SubShape( s )
             resultList.append( aShapeObj._this() )
         self.done = True
         return resultList
@@ -125,7 +144,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
         Returns:
             Quantity of edges.
         """
-        nb = self.myop.NumberOfEdges( theShape.getShape() )
+        nb = self.myop.NumberOfEdges( getLocal(theShape).getShape() )
         self.done = ( nb >= 0 )
         return nb
 
@@ -139,7 +158,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
         Returns:
             Quantity of faces.
         """
-        nb = self.myop.NumberOfFaces( theShape.getShape() )
+        nb = self.myop.NumberOfFaces( getLocal(theShape).getShape() )
         self.done = ( nb >= 0 )
         return nb
 
@@ -156,7 +175,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
             List of sub-shapes of type theShapeType, contained in theShape.
         """
         self.done = True
-        return self.myop.MakeAllSubShapes(aShape.getShape(), aType)
+        return self.myop.MakeAllSubShapes(getLocal(aShape).getShape(), aType)
 
     def MakeSubShapes(self, aShape, anIDs):
         """
@@ -170,7 +189,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
             List of GEOM.GEOM_Object, corresponding to found sub-shapes.
         """
         self.done = True
-        return self.myop.MakeSubShapes(aShape.getShape(), anIDs)
+        return self.myop.MakeSubShapes(getLocal(aShape).getShape(), anIDs)
 
     def GetExistingSubObjects(self, theShape, theGroupsOnly = False):
         """
@@ -193,12 +212,14 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
         while soIter.More():
             soChild = soIter.Value()
             soIter.Next()
-            obj = soChild.GetObject()
+            obj = SHAPERSTUDY_Object.findObject( soChild )
+            if isinstance( obj, SHAPERSTUDY_Object.SHAPERSTUDY_Field ):
+                continue # fields are not sub-objects
             if theGroupsOnly:
-                if isinstance( obj, SHAPERSTUDY_ORB._objref_SHAPER_Group):
-                    ListObj.append( obj )
-            elif isinstance( obj, SHAPERSTUDY_ORB._objref_SHAPER_Object ):
-                ListObj.append( obj )
+                if isinstance( obj, SHAPERSTUDY_Object.SHAPERSTUDY_Group ):
+                    ListObj.append( obj._this() )
+            elif obj:
+                ListObj.append( obj._this() )
         self.done = True
         return ListObj
 
@@ -206,7 +227,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
         """
         Return index of a sub-shape
         """
-        i = self.myop.GetTopologyIndex(aMainObj.getShape(), aSubObj.getShape())
+        i = self.myop.GetTopologyIndex(getLocal(aMainObj).getShape(), getLocal(aSubObj).getShape())
         self.done = ( i > 0 )
         return i
 
@@ -214,7 +235,7 @@ class SHAPERSTUDY_IShapesOperations(SHAPERSTUDY_ORB__POA.IShapesOperations,
         """
         Return a shape type as a string
         """
-        s = "%s" % aSubObj.GetShapeType()
+        s = "%s" % getLocal(aSubObj).GetShapeType()
         t = s[5:]
         return t
         
@@ -286,37 +307,112 @@ class SHAPERSTUDY_IGroupOperations(SHAPERSTUDY_ORB__POA.IGroupOperations,
         aStudy = getStudy()
         anIter = aStudy.NewChildIterator(theOwner.GetSO())
         while anIter.More():
-          aGroupObj = anIter.Value().GetObject()
+          aGroupObj = SHAPERSTUDY_Object.findObject(anIter.Value())
           if aGroupObj:
             if aGroupObj.GetEntry() == theEntry:
               self.done = True
-              return aGroupObj
+              return aGroupObj._this()
           anIter.Next()
         self.done = False
         return None # not found
 
+    def changeSelection( self, theGroup, theIndices, isUnion ):
+        """
+        Adds (if isUnion) or removes theIndices to/from the group selection, the order of
+        the selection is kept. The local group is changed directly, without CORBA.
+        """
+        aGroup = getLocal( theGroup )
+        if isinstance( aGroup, SHAPERSTUDY_Object.SHAPERSTUDY_Group ):
+            if isUnion:
+                aGroup.UnionSelection( theIndices )
+            else:
+                aGroup.DifferenceSelection( theIndices )
+        else:
+            if isUnion:
+                aSelection = SHAPERSTUDY_Object.unionSelection( theGroup.GetSelection(), theIndices )
+            else:
+                aSelection = SHAPERSTUDY_Object.differenceSelection( theGroup.GetSelection(), theIndices )
+            if aSelection is not None:
+                theGroup.SetSelection( aSelection )
+        self.done = True
+
+    def subShapesIndices( self, theGroup, theSubShapes, isUnion ):
+        """
+        Returns indices of theSubShapes in the main shape of theGroup or None if they are
+        not valid (error code is set)
+        """
+        mainShape = self.GetMainShape( theGroup )
+        if not mainShape:
+            self.done = False
+            self.errorcode = "No main shape"
+            return None
+        if isUnion:
+            groupType = self.GetType( theGroup )
+            from shaperBuilder import EnumToLong
+            for shape in theSubShapes:
+                shapeType = EnumToLong( getLocal( shape ).GetShapeType() )
+                if not groupType == shapeType:
+                    self.done = False
+                    self.errorcode = "Group type and shape type mismatch"
+                    return None
+        indices = self.GetSubShapeIndices( mainShape, theSubShapes )
+        if isUnion and 0 in indices:
+            self.done = False # set by GetSubShapeIndices
+            self.errorcode = "Not a sub-shape of the main shape"
+            return None
+        return indices
+
     def UnionList( self, theGroup, theSubShapes ):
         """
         Adds to the group all the given shapes. No errors, if some shapes are already included.
         """
+        indices = self.subShapesIndices( theGroup, theSubShapes, True )
+        if indices is not None:
+            self.changeSelection( theGroup, indices, True )
+        return
+
+    def DifferenceList( self, theGroup, theSubShapes ):
+        """
+        Removes from the group all the given shapes. No errors, if some shapes are not included.
+        """
+        indices = self.subShapesIndices( theGroup, theSubShapes, False )
+        if indices is not None:
+            self.changeSelection( theGroup, indices, False )
+        return
+
+    def checkIDs( self, theGroup, theIDs ):
+        """
+        Returns true if theIDs are valid sub-shapes IDs in the main shape of theGroup,
+        otherwise the error code is set
+        """
         self.done = False
-        indices = theGroup.GetSelection()
         mainShape = self.GetMainShape( theGroup )
         if not mainShape:
             self.errorcode = "No main shape"
-            return
-        groupType = self.GetType( theGroup )
-        from shaperBuilder import EnumToLong
-        for shape in theSubShapes:
-            shapeType = EnumToLong( shape.GetShapeType() )
-            if not groupType == shapeType:
-                self.errorcode = "Group type and shape type mismatch"
-                return
-            i = self.myop.GetSubShapeIndex( mainShape.getShape(), shape.getShape() )
-            if not i in indices:
-                indices.append( i )
-        theGroup.SetSelection( indices )
-        self.done = True
+            return False
+        aNbSubShapes = self.myop.NumberOfSubShapes( getLocal( mainShape ).getShape() )
+        for anID in theIDs:
+            if anID < 1 or anID > aNbSubShapes:
+                self.errorcode = "Invalid sub-shape index " + str( anID )
+                return False
+        return True
+
+    def UnionIDs( self, theGroup, theSubShapes ):
+        """
+        Adds to the group all the given sub-shapes IDs. No errors, if some are already included.
+        Nothing is changed if some ID is not valid.
+        """
+        if self.checkIDs( theGroup, theSubShapes ):
+            self.changeSelection( theGroup, theSubShapes, True )
+        return
+
+    def DifferenceIDs( self, theGroup, theSubShapes ):
+        """
+        Removes from the group all the given sub-shapes IDs. No errors, if some are not included.
+        Nothing is changed if some ID is not valid.
+        """
+        if self.checkIDs( theGroup, theSubShapes ):
+            self.changeSelection( theGroup, theSubShapes, False )
         return
 
     def GetMainShape( self, theGroup ):
@@ -325,15 +421,15 @@ class SHAPERSTUDY_IGroupOperations(SHAPERSTUDY_ORB__POA.IGroupOperations,
         """
         if not hasattr(theGroup, "GetSO"): # only SHAPERSTUDY objects are allowed
           return None
-        aSO = theGroup.GetSO()
+        aSO = getLocal( theGroup ).GetSO()
         if not aSO:
             return None
         aFatherSO = aSO.GetFather()
         if not aFatherSO:
             return None
-        anObj = aFatherSO.GetObject()
-        if isinstance( anObj, SHAPERSTUDY_ORB._objref_SHAPER_Object ):
-            return anObj
+        anObj = SHAPERSTUDY_Object.findObject( aFatherSO )
+        if isinstance( anObj, SHAPERSTUDY_Object.SHAPERSTUDY_Object ):
+            return anObj._this()
         else:
             return None
 
@@ -341,13 +437,13 @@ class SHAPERSTUDY_IGroupOperations(SHAPERSTUDY_ORB__POA.IGroupOperations,
         """
         Returns a type (int) of sub-objects stored in the group
         """
-        return theGroup.GetSelectionType()
+        return getLocal( theGroup ).GetSelectionType()
 
     def GetObjects( self, theGroup ):
         """
         Returns a list of sub-objects ID stored in the group
         """
-        return theGroup.GetSelection()
+        return getLocal( theGroup ).GetSelection()
 
     pass
 
@@ -382,11 +478,10 @@ class SHAPERSTUDY_IFieldOperations(SHAPERSTUDY_ORB__POA.IFieldOperations,
         aStudy = getStudy()
         anIter = aStudy.NewChildIterator(theOwner.GetSO())
         while anIter.More():
-          if len(anIter.Value().GetIOR()):
-            aFieldObj = anIter.Value().GetObject()
-            if aFieldObj:
-              if aFieldObj.GetEntry() == theEntry:
-                return aFieldObj
+          aFieldObj = SHAPERSTUDY_Object.findObject(anIter.Value())
+          if aFieldObj:
+            if aFieldObj.GetEntry() == theEntry:
+              return aFieldObj._this()
           anIter.Next()
         return None # not found
 
@@ -401,9 +496,9 @@ class SHAPERSTUDY_IFieldOperations(SHAPERSTUDY_ORB__POA.IFieldOperations,
         aStudy = getStudy()
         anIter = aStudy.NewChildIterator(shape.GetSO())
         while anIter.More():
-          aFieldObj = anIter.Value().GetObject()
-          if aFieldObj and isinstance(aFieldObj, SHAPERSTUDY_ORB._objref_SHAPER_Field):
-            aResList.append(aFieldObj)
+          aFieldObj = SHAPERSTUDY_Object.findObject(anIter.Value())
+          if isinstance(aFieldObj, SHAPERSTUDY_Object.SHAPERSTUDY_Field):
+            aResList.append(aFieldObj._this())
           anIter.Next()
         return aResList
 
@@ -429,7 +524,7 @@ class SHAPERSTUDY_IMeasureOperations(SHAPERSTUDY_ORB__POA.IMeasureOperations,
         theIndex Index to find vertex by this index (starting from zero)
         theUseOri To consider edge/wire orientation or not
         """
-        v = self.myop.GetVertexByIndex( theShape.getShape(), theIndex, theUseOri )
+        v = self.myop.GetVertexByIndex( getLocal(theShape).getShape(), theIndex, theUseOri )
         self.done = ( v > 0 )
         if self.done:
             aShapeObj = SHAPERSTUDY_Object.SHAPERSTUDY_Object()
@@ -447,7 +542,7 @@ class SHAPERSTUDY_IMeasureOperations(SHAPERSTUDY_ORB__POA.IMeasureOperations,
         Returns:
             Value of the minimal distance between the given shapes.
         """
-        d = self.myop.MinDistance(theShape1.getShape(), theShape2.getShape())
+        d = self.myop.MinDistance(getLocal(theShape1).getShape(), getLocal(theShape2).getShape())
         self.done = ( d >= 0 )
         return d, 0,0,0, 0,0,0
 
@@ -458,7 +553,7 @@ class SHAPERSTUDY_IMeasureOperations(SHAPERSTUDY_ORB__POA.IMeasureOperations,
         Returns:
             [x, y, z]
         """
-        d = self.myop.PointCoordinates(Point.getShape())
+        d = self.myop.PointCoordinates(getLocal(Point).getShape())
         self.done = len( d )
         if self.done == 3:
             return d[0],d[1],d[2]
@@ -477,7 +572,7 @@ class SHAPERSTUDY_IMeasureOperations(SHAPERSTUDY_ORB__POA.IMeasureOperations,
              EdgeMin,EdgeMax: Min and max tolerances of the edges.
              VertMin,VertMax: Min and max tolerances of the vertices.
         """
-        tol = self.myop.GetTolerance(theShape.getShape())
+        tol = self.myop.GetTolerance(getLocal(theShape).getShape())
         self.done = tol > 0;
         return tol,tol, tol,tol, tol,tol
 
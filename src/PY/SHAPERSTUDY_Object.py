@@ -20,10 +20,13 @@
 from salome.kernel import SHAPERSTUDY_ORB
 from salome.kernel import SHAPERSTUDY_ORB__POA
 from salome.kernel import GEOM
-from SHAPERSTUDY_utils import getEngine, getStudy
+from SHAPERSTUDY_utils import getEngine, getStudy, getServant, getPOA
 from salome.kernel import salome
 
 import StudyData_Swig
+from SHAPERSTUDY_Persistence import StringValues
+
+import array
 
 # converter from the integer values to idl shape_type enumerations
 __shape_types__ = {
@@ -31,6 +34,12 @@ __shape_types__ = {
   3:GEOM.SHELL, 4:GEOM.FACE, 5:GEOM.WIRE,
   6:GEOM.EDGE, 7:GEOM.VERTEX, 8:GEOM.SHAPE, 9:GEOM.FLAT}
 
+# index of the objects of the SHAPER-STUDY: internal entry -> local servant
+__entry2Object__ = {}
+
+# index of the published objects of the SHAPER-STUDY: SObject ID -> local servant
+__so2Object__ = {}
+
 class SHAPERSTUDY_GenericObject:
     """
     Implement methods of SALOME::GenericObj
@@ -58,6 +67,9 @@ class SHAPERSTUDY_GenericObject:
             poa = getPOA()
             oid=poa.servant_to_id(self)
             poa.deactivate_object(oid)
+            anEntry = getattr(self, "entry", None)
+            if anEntry and __entry2Object__.get(anEntry) is self:
+                del __entry2Object__[anEntry] # deactivated servant can not be found any more
             if hasattr(self,"SetSO"):
                 self.SetSO(None) # release a GenericObject SO
             #print("UnRegister() --------- OK")
@@ -78,9 +90,12 @@ class SHAPERSTUDY_Object(SHAPERSTUDY_ORB__POA.SHAPER_Object,
     """
     Constructs an instance of SHAPERSTUDY Object.
     """
+    ior = None # IOR of the CORBA object, to check that the published SObject refers to it
+
     def __init__ ( self, *args):
         SHAPERSTUDY_GenericObject.__init__(self)
         self.SO = None
+        self.soID = ""
         self.data = None
         self.entry = ""
         self.type = 1 # by default it is a shape (Import feature in GEOMImpl_Types.hxx)
@@ -147,6 +162,14 @@ class SHAPERSTUDY_Object(SHAPERSTUDY_ORB__POA.SHAPER_Object,
         else:
           self.data = StudyData_Swig.StudyData_Object(theStream)
 
+    def SetShapeByBinStream(self, theStream, theOldStream):
+        """
+        Sets the current and the old shapes of the object by streams in OCCT binary BRep format
+        """
+        if not self.data:
+          self.data = StudyData_Swig.StudyData_Object()
+        self.data.SetShapeByBinStream(theStream, theOldStream)
+
     """
     Methods from BaseObject
     """
@@ -233,8 +256,13 @@ class SHAPERSTUDY_Object(SHAPERSTUDY_ORB__POA.SHAPER_Object,
         if theSO:
             theSO.Register() # I hold a GenericObject!
         if self.SO:
+            if __so2Object__.get(self.soID) is self:
+                del __so2Object__[self.soID]
             self.SO.UnRegister()
         self.SO = theSO
+        self.soID = theSO.GetID() if theSO else ""
+        if theSO:
+            __so2Object__[self.soID] = self
 
     def GetSO( self ):
         """
@@ -242,6 +270,14 @@ class SHAPERSTUDY_Object(SHAPERSTUDY_ORB__POA.SHAPER_Object,
         """
         return self.SO
 
+    def getIOR( self ):
+        """
+        Returns IOR of the CORBA object of this servant, computed once
+        """
+        if self.ior is None:
+            self.ior = salome.orb.object_to_string(self._this())
+        return self.ior
+
     def IsParametrical(self):
         """
         Returns true if the current object has connection to a parametrical model
@@ -276,52 +312,52 @@ class SHAPERSTUDY_Object(SHAPERSTUDY_ORB__POA.SHAPER_Object,
         aDead = SHAPERSTUDY_Object()
         aDeadEntry = "dead" + str(anIndex) + "_" + self.GetEntry()
         aDead.SetEntry(aDeadEntry)
-        aDead.SetShapeByStream(self.data.oldShapeStream())
+        aDead.data = StudyData_Swig.StudyData_Object()
+        aDead.data.SetShapeByOldShape(self.data) # the old shape is shared, not copied
         aDeadObj = aDead._this()
         anIOR = salome.orb.object_to_string(aDeadObj)
         aDeadSO.SetAttrString("AttributeIOR", anIOR)
         aDead.SetSO(aDeadSO)
+        __entry2Object__[aDeadEntry] = aDead
         if self.GetTick() > 2:
           aDead.data.setTick(self.GetTick() - 1) # set the tick of an old shape
         # make dead-copy also sub-groups
         aSOIter = aStudy.NewChildIterator(self.SO)
         while aSOIter.More():
           aGroupSO = aSOIter.Value()
-          anIOR = aGroupSO.GetIOR()
-          if len(anIOR):
-            aGroup = salome.orb.string_to_object(anIOR)
-            if isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Group) or \
-               isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Field):
-              if isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Group):
-                aDeadGroup = SHAPERSTUDY_Group()
-              else:
-                aDeadGroup = SHAPERSTUDY_Field()
-              aDeadGroupEntry = "dead" + str(anIndex) + "_" + aGroup.GetEntry()
-              aDeadGroup.SetEntry(aDeadGroupEntry)
-              aDeadGroup.SetSelectionType(aGroup.GetSelectionType())
-              anOldSelection = aGroup.GetSelectionOld()
-              if len(anOldSelection) == 0: # in case there is no old modification, get the current, same as in shape
-                anOldSelection = aGroup.GetSelection()
-              aDeadGroup.SetSelection(anOldSelection)
-              if isinstance(aGroup, SHAPERSTUDY_ORB._objref_SHAPER_Field): # additional field data
-                aDeadGroup.SetValuesType(aGroup.GetValuesType())
-                aDeadGroup.SetSteps(aGroup.GetSteps())
-                aDeadGroup.SetComponents(aGroup.GetComponents())
-                for aStep in aGroup.GetSteps():
-                  aStepObj = aGroup.GetStep(aStep)
-                  aDeadGroup.AddFieldStep(aStepObj.GetStamp(), aStep, aStepObj.GetValues())
-              aDeadGroupSO = aBuilder.NewObject(aDeadSO)
-              aDeadGroup.SetSO(aDeadGroupSO)
-              # 15.01.20 groups and fields names stays the same
-              #aDeadGroupSO.SetAttrString("AttributeName", aGroupSO.GetName() + " (" + str(anIndex) + ")")
-              aDeadGroupSO.SetAttrString("AttributeName", aGroupSO.GetName())
-              aRes, aPixMap = aBuilder.FindAttribute(aGroupSO, "AttributePixMap")
-              if aRes:
-                aDeadPixMap = aBuilder.FindOrCreateAttribute(aDeadGroupSO, "AttributePixMap")
-                aDeadPixMap.SetPixMap(aPixMap.GetPixMap())
-              aDeadGroupObj = aDeadGroup._this()
-              anIOR = salome.orb.object_to_string(aDeadGroupObj)
-              aDeadGroupSO.SetAttrString("AttributeIOR", anIOR)
+          aGroup = findObject(aGroupSO)
+          if isinstance(aGroup, SHAPERSTUDY_Group): # fields are groups too
+            if isinstance(aGroup, SHAPERSTUDY_Field):
+              aDeadGroup = SHAPERSTUDY_Field()
+            else:
+              aDeadGroup = SHAPERSTUDY_Group()
+            aDeadGroupEntry = "dead" + str(anIndex) + "_" + aGroup.GetEntry()
+            aDeadGroup.SetEntry(aDeadGroupEntry)
+            aDeadGroup.SetSelectionType(aGroup.GetSelectionType())
+            anOldSelection = aGroup.GetSelectionOld()
+            if len(anOldSelection) == 0: # in case there is no old modification, get the current, same as in shape
+              anOldSelection = aGroup.GetSelection()
+            aDeadGroup.SetSelection(anOldSelection)
+            if isinstance(aGroup, SHAPERSTUDY_Field): # additional field data
+              aDeadGroup.SetValuesType(aGroup.GetValuesType())
+              aDeadGroup.SetSteps(aGroup.GetSteps())
+              aDeadGroup.SetComponents(aGroup.GetComponents())
+              for aStep in aGroup.GetSteps(): # values arrays are never modified, so, shared
+                aStepData = aGroup.getStepData(aStep)
+                aDeadGroup.AddFieldStep(aStepData.GetStamp(), aStep, aStepData.values)
+            aDeadGroupSO = aBuilder.NewObject(aDeadSO)
+            aDeadGroup.SetSO(aDeadGroupSO)
+            # 15.01.20 groups and fields names stays the same
+            #aDeadGroupSO.SetAttrString("AttributeName", aGroupSO.GetName() + " (" + str(anIndex) + ")")
+            aDeadGroupSO.SetAttrString("AttributeName", aGroupSO.GetName())
+            aRes, aPixMap = aBuilder.FindAttribute(aGroupSO, "AttributePixMap")
+            if aRes:
+              aDeadPixMap = aBuilder.FindOrCreateAttribute(aDeadGroupSO, "AttributePixMap")
+              aDeadPixMap.SetPixMap(aPixMap.GetPixMap())
+            aDeadGroupObj = aDeadGroup._this()
+            anIOR = salome.orb.object_to_string(aDeadGroupObj)
+            aDeadGroupSO.SetAttrString("AttributeIOR", anIOR)
+            __entry2Object__[aDeadGroupEntry] = aDeadGroup
           aSOIter.Next()
 
         return aDeadObj
@@ -353,6 +389,83 @@ class SHAPERSTUDY_Object(SHAPERSTUDY_ORB__POA.SHAPER_Object,
 
     pass
 
+class SHAPERSTUDY_SubShape(SHAPERSTUDY_Object):
+    """
+    Constructs a sub-shape object by the pointer to the extracted sub-shape.
+    The shape data is created on the first use only, so sub-shapes are cheap to create in bulk.
+    """
+    def __init__ ( self, theShape):
+        SHAPERSTUDY_Object.__init__(self)
+        self.subShape = theShape # pointer to the TopoDS_Shape, used till the data is created
+        pass
+
+    def getData(self):
+        """
+        Returns the shape data, creates it by the sub-shape if it is not created yet
+        """
+        if self.subData is None and self.subShape:
+          self.subData = StudyData_Swig.StudyData_Object()
+          self.subData.SetShapeByPointer(self.subShape)
+          self.subShape = 0
+        return self.subData
+
+    def setData(self, theData):
+        """
+        Sets the shape data, the extracted sub-shape is not needed any more
+        """
+        self.subData = theData
+        if theData is not None:
+          self.subShape = 0
+
+    data = property(getData, setData)
+
+    pass
+
+def findObject(theSO):
+    """
+    Returns the local servant of the object published in theSO, None if there is no such object
+    """
+    anIOR = theSO.GetIOR()
+    anObj = __so2Object__.get(theSO.GetID())
+    if anObj is not None and anObj.getIOR() != anIOR: # SObject refers to another object now
+      del __so2Object__[theSO.GetID()]
+      anObj = None
+    if anObj is None:
+      if len(anIOR):
+        anObj = getServant(salome.orb.string_to_object(anIOR))
+        if not isinstance(anObj, SHAPERSTUDY_Object):
+          return None
+    return anObj
+
+def unionSelection(theSelection, theIndices, theSelected = None):
+    """
+    Returns theSelection with appended theIndices that are not selected yet, keeping the order,
+    or None if nothing is added. theSelected is the set of theSelection indices, if known.
+    """
+    if theSelected is None:
+      theSelected = set(theSelection)
+    anAdded = []
+    aNew = set()
+    for anIndex in theIndices:
+      if not anIndex in theSelected and not anIndex in aNew:
+        aNew.add(anIndex)
+        anAdded.append(anIndex)
+    if not anAdded:
+      return None
+    return list(theSelection) + anAdded
+
+def differenceSelection(theSelection, theIndices, theSelected = None):
+    """
+    Returns theSelection without theIndices, keeping the order, or None if nothing is removed.
+    theSelected is the set of theSelection indices, if known.
+    """
+    if theSelected is None:
+      theSelected = set(theSelection)
+    aRemoved = theSelected.intersection(theIndices)
+    if not aRemoved:
+      return None
+    return [anIndex for anIndex in theSelection if not anIndex in aRemoved]
+
 class SHAPERSTUDY_Group(SHAPERSTUDY_ORB__POA.SHAPER_Group, SHAPERSTUDY_Object):
     """
     Constructs an instance of SHAPERSTUDY Group
@@ -361,9 +474,11 @@ class SHAPERSTUDY_Group(SHAPERSTUDY_ORB__POA.SHAPER_Group, SHAPERSTUDY_Object):
         SHAPERSTUDY_GenericObject.__init__(self)
         self.seltype = None
         self.selection = []
+        self.selectionSet = None # set of the current selection indices, computed on demand
         self.selectionTick = -2 # tick of the main shape when the current selection is set
         self.selectionOld = [] # keep selection for breaking link
         self.SO = None
+        self.soID = ""
         self.data = None
         self.entry = ""
         self.type = 37 # a group type
@@ -385,6 +500,7 @@ class SHAPERSTUDY_Group(SHAPERSTUDY_ORB__POA.SHAPER_Group, SHAPERSTUDY_Object):
         """
         Sets what is returned in the GEOM_IGroupOperations::GetObjects
         """
+        theSelection = list(theSelection) # the caller may change its list later
         aTick = -2
         if self.SO:
           aMainShape = self.GetMainShape()
@@ -393,11 +509,13 @@ class SHAPERSTUDY_Group(SHAPERSTUDY_ORB__POA.SHAPER_Group, SHAPERSTUDY_Object):
         if aTick > self.selectionTick or aTick == -2:
           self.selectionOld = self.selection
           self.selection = theSelection
+          self.selectionSet = None
           self.selectionTick = aTick
           #print("Set selection " + self.entry + " old = " + str(self.selectionOld) + " new = " + str(self.selection) + " tick = " + str(aTick))
         elif self.selection != theSelection:
           self.selectionOld = self.selection
           self.selection = theSelection
+          self.selectionSet = None
           if self.selectionTick < 0:
             self.selectionTick = aTick + 1
           else:
@@ -407,16 +525,40 @@ class SHAPERSTUDY_Group(SHAPERSTUDY_ORB__POA.SHAPER_Group, SHAPERSTUDY_Object):
 
     def GetSelection(self):
         """
-        Returns the selected sub-shapes indices
+        Returns the selected sub-shapes indices (a copy: in-process callers get no CORBA copy)
         """
-        return self.selection
+        return list(self.selection)
 
     def GetSelectionOld(self):
         """
         Returns the previously selected sub-shapes indices
         """
         #print("get selection OLD " + self.entry + " old = " + str(self.selectionOld) + " new = " + str(self.selection))
-        return self.selectionOld
+        return list(self.selectionOld)
+
+    def selectedSet(self):
+        """
+        Returns the set of the selected sub-shapes indices
+        """
+        if self.selectionSet is None:
+          self.selectionSet = set(self.selection)
+        return self.selectionSet
+
+    def UnionSelection(self, theIndices):
+        """
+        Appends to the selection theIndices which are not selected yet
+        """
+        aSelection = unionSelection(self.selection, theIndices, self.selectedSet())
+        if aSelection is not None:
+          self.SetSelection(aSelection)
+
+    def DifferenceSelection(self, theIndices):
+        """
+        Removes theIndices from the selection
+        """
+        aSelection = differenceSelection(self.selection, theIndices, self.selectedSet())
+        if aSelection is not None:
+          self.SetSelection(aSelection)
 
     def IsMainShape( self ):
         """
@@ -434,7 +576,7 @@ class SHAPERSTUDY_Group(SHAPERSTUDY_ORB__POA.SHAPER_Group, SHAPERSTUDY_Object):
         """
         Get a list of ID's of sub-shapes in the main shape.
         """
-        return self.selection
+        return list(self.selection)
 
     def getShape( self ):
         """
@@ -481,6 +623,7 @@ class SHAPERSTUDY_Field(SHAPERSTUDY_ORB__POA.SHAPER_Field, SHAPERSTUDY_Group):
         self.selectionTick = -2 # tick of the main shape when the current selection is set
         self.selectionOld = [] # keep selection for breaking link
         self.SO = None
+        self.soID = ""
         self.data = None
         self.entry = None
         self.type = 52 # a field type
@@ -488,7 +631,7 @@ class SHAPERSTUDY_Field(SHAPERSTUDY_ORB__POA.SHAPER_Field, SHAPERSTUDY_Group):
         self.steps = [] # list of long
         self.components = [] # string array, names of the components
         self.name = None # name, string
-        self.fieldsteps = {} # FieldSteps objects identified by step ID
+        self.fieldsteps = {} # FieldSteps servants identified by step ID, activated on demand
         pass
 
     def SetValuesType( self, theType ):
@@ -525,16 +668,18 @@ class SHAPERSTUDY_Field(SHAPERSTUDY_ORB__POA.SHAPER_Field, SHAPERSTUDY_Group):
       return super().GetMainShape()
 
     def SetSteps( self, theSteps ):
-      self.steps = theSteps
+      self.steps = list(theSteps)
 
     def GetSteps( self ):
-      return self.steps
+      return list(self.steps)
 
     def SetComponents( self, theComponents ):
-      self.components = theComponents
+      self.components = list(theComponents)
+      for aStep in self.fieldsteps.values(): # values of steps are grouped by the new number
+        aStep.nbcomps = max(1, len(theComponents))
     
     def GetComponents( self ):
-      return self.components
+      return list(self.components)
 
     def GetDimension( self ):
       aShapeType = super().GetSelectionType()
@@ -551,6 +696,8 @@ class SHAPERSTUDY_Field(SHAPERSTUDY_ORB__POA.SHAPER_Field, SHAPERSTUDY_Group):
       return None # unknown case
 
     def ClearFieldSteps( self ):
+       for aStep in self.fieldsteps.values():
+         aStep.deactivate()
        self.fieldsteps = {}
 
     def AddFieldStep( self, theStampID, theStepID, theValues):
@@ -561,31 +708,145 @@ class SHAPERSTUDY_Field(SHAPERSTUDY_ORB__POA.SHAPER_Field, SHAPERSTUDY_Group):
         aFieldStep = SHAPER_IntFieldStep()
       elif self.valtype == 2:
         aFieldStep = SHAPER_DoubleFieldStep()
-      
-      aFieldStep.SetStep(theStampID, theStepID, theValues)
-      self.fieldsteps[theStepID] = aFieldStep._this()
+      elif self.valtype == 3:
+        aFieldStep = SHAPER_StringFieldStep()
+      self.addFieldStep(aFieldStep, theStampID, theStepID, theValues)
+
+    def AddFieldStringStep( self, theStampID, theStepID, theValues):
+      """
+      Appends a step of string values (passed as strings, not as the list of doubles)
+      """
+      self.addFieldStep(SHAPER_StringFieldStep(), theStampID, theStepID, theValues)
+
+    def addFieldStep( self, theFieldStep, theStampID, theStepID, theValues):
+      """
+      Defines theFieldStep by the given data and puts it to the field instead of the existing one
+      """
+      theFieldStep.SetStep(theStampID, theStepID, theValues)
+      theFieldStep.nbcomps = max(1, len(self.components))
+      if theStepID in self.fieldsteps:
+        self.fieldsteps[theStepID].deactivate()
+      self.fieldsteps[theStepID] = theFieldStep # CORBA object is activated in GetStep only
 
     def GetStep( self, theStepID ):
+       return self.fieldsteps[theStepID].activate()
+
+    def getStepData( self, theStepID ):
+       """
+       Returns the local step object (servant) by theStepID
+       """
        return self.fieldsteps[theStepID]
 
+    def UnRegister( self ):
+       """
+       Decrease the reference count, when the field is released, deactivates also its steps
+       """
+       super().UnRegister()
+       if self.cnt <= 0:
+         self.ClearFieldSteps()
+
     pass
 
 class SHAPER_FieldStep:
     """
     Base class for all step-classes
     """
+    typecode = 'd' # type code of the values array
+    valuetype = float # type of one value
+    nbcomps = 1 # number of components: values of one sub-shape
+    active = False # true if the CORBA object of the step is active
+    cnt = 0 # reference count of the active CORBA object
+
     def __init__ ( self, *args):
         self.stamp = None  # long, ID of stamp
         self.step = None   # long, ID of step
         self.values = None # array of values of the needed type
 
     """
-    Defines all parameters of the step
+    Returns the CORBA object of the step, activates it if it is not active yet;
+    each returned reference is counted and must be released by UnRegister
+    """
+    def activate( self ):
+        if not self.active:
+          self.active = True
+          self.cnt = 1
+        else:
+          self.cnt += 1
+        return self._this()
+
+    """
+    Deactivates the CORBA object of the step if it is active
+    """
+    def deactivate( self ):
+        if self.active:
+          self.active = False
+          aPOA = getPOA()
+          aPOA.deactivate_object(aPOA.servant_to_id(self))
+
+    """
+    Increase the reference count (mark as used by another object)
+    """
+    def Register( self ):
+        self.cnt += 1
+
+    """
+    Decrease the reference count, deactivates the step when it is not used any more
+    (the step stays in the field and is activated again by the next GetStep)
+    """
+    def UnRegister( self ):
+        self.cnt -= 1
+        if self.cnt <= 0:
+          self.deactivate()
+
+    """
+    Obsolete, left for compatibility reasons only. Use UnRegister() instead
+    """
+    def Destroy( self ):
+        self.UnRegister()
+
+    """
+    Defines all parameters of the step, values are converted to the typed array once here
     """
     def SetStep( self, theStamp, theStep, theValues ):
         self.stamp = theStamp
         self.step = theStep
-        self.values = theValues
+        self.values = self.makeValues(theValues)
+
+    """
+    Returns theValues converted to the typed array
+    """
+    def makeValues( self, theValues ):
+        if isinstance(theValues, array.array) and theValues.typecode == self.typecode:
+          return theValues # arrays are never modified, so, may be shared
+        return array.array(self.typecode, map(self.valuetype, theValues))
+
+    """
+    Returns values as a list of the needed type (converted from the array in one call)
+    """
+    def GetValues( self ):
+        return self.values.tolist()
+
+    """
+    Returns theCount values starting from theOffset (less if the end is reached)
+    """
+    def GetValuesRange( self, theOffset, theCount ):
+        if theOffset < 0 or theCount <= 0:
+          return []
+        return self.values[theOffset:theOffset + theCount].tolist()
+
+    """
+    Returns values of all components of sub-shapes with theSubIDs (starting from 1)
+    among sub-shapes of the field dimension, empty list if some index is out of range
+    """
+    def GetValuesForSubShapes( self, theSubIDs ):
+        aResult = []
+        aNbSubs = len(self.values) // self.nbcomps
+        for anID in theSubIDs:
+          if anID < 1 or anID > aNbSubs:
+            return []
+          aStart = (anID - 1) * self.nbcomps
+          aResult.extend(self.values[aStart:aStart + self.nbcomps].tolist())
+        return aResult
      
     """
     Returns stamp ID
@@ -609,53 +870,53 @@ class SHAPER_DoubleFieldStep(SHAPERSTUDY_ORB__POA.SHAPER_DoubleFieldStep, SHAPER
     """
     Constructs an instance of SHAPERSTUDY Field step of type Double
     """
+    typecode = 'd'
+    valuetype = float
+
     def __init__ ( self, *args):
         pass
 
-    """
-    Returns values as an array of the needed type
-    """
-    def GetValues( self ):
-        aResult = [] # to make any type of result, create a corba-type
-        for i in self.values:
-          aResult.append(float(i))
-        return aResult
-
     pass
 
 class SHAPER_IntFieldStep(SHAPERSTUDY_ORB__POA.SHAPER_IntFieldStep, SHAPER_FieldStep):
     """
-    Constructs an instance of SHAPERSTUDY Field step of type Double
+    Constructs an instance of SHAPERSTUDY Field step of type Int
     """
+    typecode = 'i'
+    valuetype = int
+
     def __init__ ( self, *args):
         pass
 
+    pass
+
+class SHAPER_BoolFieldStep(SHAPERSTUDY_ORB__POA.SHAPER_BoolFieldStep, SHAPER_FieldStep):
     """
-    Returns values as an array of the needed type
+    Constructs an instance of SHAPERSTUDY Field step of type Bool
     """
-    def GetValues( self ):
-        aResult = [] # to make any type of result, create a corba-type
-        for i in self.values:
-          aResult.append(int(i))
-        return aResult
+    typecode = 'b'
+    valuetype = int
+
+    def __init__ ( self, *args):
+        pass
 
     pass
 
-class SHAPER_BoolFieldStep(SHAPERSTUDY_ORB__POA.SHAPER_BoolFieldStep, SHAPER_FieldStep):
+class SHAPER_StringFieldStep(SHAPERSTUDY_ORB__POA.SHAPER_StringFieldStep, SHAPER_FieldStep):
     """
-    Constructs an instance of SHAPERSTUDY Field step of type Double
+    Constructs an instance of SHAPERSTUDY Field step of type String
     """
+    valuetype = str
+
     def __init__ ( self, *args):
         pass
 
     """
-    Returns values as an array of the needed type
+    Returns theValues packed into StringValues
     """
-    def GetValues( self ):
-        aResult = [] # to make any type of result, create a corba-type
-        for i in self.values:
-          aResult.append(int(i))
-        return aResult
+    def makeValues( self, theValues ):
+        if isinstance(theValues, StringValues):
+          return theValues # never modified, so, may be shared
+        return StringValues(theValues)
 
     pass
-
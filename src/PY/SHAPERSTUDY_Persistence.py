@@ -0,0 +1,405 @@
+# Copyright (C) 2019-2026  CEA, EDF
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# See http://www.salome-platform.org/ or email : webmaster.salome@opencascade.com
+#
+
+# ======================================================================================
+# Binary persistence format of the SHAPER-STUDY data (SHAPERSTUDY_Gen.Save/Load).
+#
+# The stream is:
+#   header  : MAGIC, version (uint32)
+#   records : payloads of the objects, one after another
+#   TOC     : for each record - kind (uint8), internal entry, file name (empty if the record
+#             is in the stream), offset and size (uint64)
+#   footer  : offset of the TOC (uint64), number of records (uint32)
+#
+# All numbers are little-endian. Shapes are stored in OCCT binary BRep format in blob records,
+# keyed by the digest of the content, so the same shape version of live,
+# old and dead objects is stored once. Field values are stored as packed typed arrays,
+# string values as an array of offsets and one UTF-8 blob. In the multi-file mode records are written
+# into separate files (one per object) and the stream contains only header, TOC and footer.
+# ======================================================================================
+
+import array
+import hashlib
+import os
+import re
+import struct
+import sys
+
+MAGIC = b"SHAPERSTUDY\0"
+VERSION = 1
+
+# kinds of records
+SHAPE = 1
+GROUP = 2
+FIELD = 3
+BLOB = 4
+
+# array type codes of the field values by the field values type (0 - bool, 1 - int, 2 - double),
+# string values (type 3) are stored as StringValues
+__value_types__ = {0:'b', 1:'i', 2:'d'}
+STRING_VALUES = 3
+
+__footer__ = struct.Struct("<QI")
+
+def isBinary(theStream):
+    """
+    Returns true if theStream is in the binary format (not in the old text one)
+    """
+    return bytes(theStream[:len(MAGIC)]) == MAGIC
+
+def valuesTypeCode(theValuesType):
+    """
+    Returns the array type code for the values of the field of theValuesType
+    """
+    return __value_types__[theValuesType]
+
+class StringValues:
+    """
+    Compact list of string values: all values are packed into one UTF-8 blob,
+    offsets[i] is the start of the i-th value in the blob, the last offset is the blob size
+    """
+    def __init__ ( self, theValues = (), theOffsets = None, theBlob = None ):
+        if theOffsets is not None:
+          self.offsets = theOffsets
+          self.blob = bytes(theBlob)
+        else:
+          self.offsets = array.array('q', [0])
+          aChunks = []
+          aSize = 0
+          for aValue in theValues:
+            aBytes = str(aValue).encode()
+            aChunks.append(aBytes)
+            aSize += len(aBytes)
+            self.offsets.append(aSize)
+          self.blob = b"".join(aChunks)
+
+    def __len__( self ):
+        return len(self.offsets) - 1
+
+    def __getitem__( self, theIndex ):
+        if isinstance(theIndex, slice):
+          aStart, aStop, aStep = theIndex.indices(len(self))
+          if aStep != 1:
+            return StringValues([self[anIndex] for anIndex in range(aStart, aStop, aStep)])
+          aStop = max(aStart, aStop)
+          aBegin = self.offsets[aStart]
+          anOffsets = array.array('q', [anOffset - aBegin for anOffset in self.offsets[aStart:aStop + 1]])
+          return StringValues(theOffsets = anOffsets, theBlob = self.blob[aBegin:self.offsets[aStop]])
+        if theIndex < 0:
+          theIndex += len(self)
+        if theIndex < 0 or theIndex >= len(self):
+          raise IndexError("string value index out of range")
+        return self.blob[self.offsets[theIndex]:self.offsets[theIndex + 1]].decode()
+
+    def __iter__( self ):
+        for anIndex in range(len(self)):
+          yield self[anIndex]
+
+    def tolist( self ):
+        return list(self)
+
+    pass
+
+class Packer:
+    """
+    Packs values of one record into a list of binary chunks (big data is not copied)
+    """
+    def __init__ ( self ):
+        self.chunks = []
+        self.size = 0
+
+    def Raw( self, theData ):
+        self.chunks.append(theData)
+        self.size += len(theData)
+
+    def Int( self, theValue ):
+        self.Raw(struct.pack("<i", theValue))
+
+    def Bytes( self, theValue ):
+        self.Raw(struct.pack("<Q", len(theValue)))
+        self.Raw(theValue)
+
+    def String( self, theValue ):
+        self.Bytes(theValue.encode())
+
+    def Array( self, theTypeCode, theValues ):
+        anArray = theValues
+        if not isinstance(anArray, array.array) or anArray.typecode != theTypeCode:
+          anArray = array.array(theTypeCode, theValues)
+        if sys.byteorder == "big":
+          anArray = array.array(theTypeCode, anArray)
+          anArray.byteswap()
+        self.Raw(struct.pack("<Q", len(anArray)))
+        self.Raw(memoryview(anArray).cast('B'))
+
+    pass
+
+class Unpacker:
+    """
+    Reads values of one record from a binary buffer, in the same order as they were packed
+    """
+    def __init__ ( self, theBuffer ):
+        self.buffer = memoryview(theBuffer)
+        self.pos = 0
+
+    def Int( self ):
+        aValue = struct.unpack_from("<i", self.buffer, self.pos)[0]
+        self.pos += 4
+        return aValue
+
+    def Bytes( self ):
+        aSize = struct.unpack_from("<Q", self.buffer, self.pos)[0]
+        self.pos += 8
+        aValue = self.buffer[self.pos:self.pos + aSize]
+        self.pos += aSize
+        return aValue
+
+    def String( self ):
+        return bytes(self.Bytes()).decode()
+
+    def Array( self, theTypeCode ):
+        aSize = struct.unpack_from("<Q", self.buffer, self.pos)[0]
+        self.pos += 8
+        anArray = array.array(theTypeCode)
+        aBytes = aSize * anArray.itemsize
+        anArray.frombytes(self.buffer[self.pos:self.pos + aBytes])
+        self.pos += aBytes
+        if sys.byteorder == "big":
+          anArray.byteswap()
+        return anArray
+
+    pass
+
+class Writer:
+    """
+    Writes records of the SHAPER-STUDY objects to theSink (file-like object) as soon as they
+    are added, so only one object is kept in memory. If theDirectory is defined, records
+    are written into separate files there, named by thePrefix and the record number;
+    record files of the previous save with the same prefix are removed.
+    """
+    def __init__ ( self, theSink, theDirectory = None, thePrefix = "" ):
+        self.sink = theSink
+        self.directory = theDirectory
+        self.prefix = thePrefix
+        self.size = 0
+        self.toc = []
+        self.blobs = set() # keys of already written blobs
+        if self.directory:
+          self.RemoveRecordFiles()
+        self.Write([MAGIC, struct.pack("<I", VERSION)])
+
+    def RemoveRecordFiles( self ):
+        """
+        Removes record files with the prefix of this writer from the directory
+        """
+        aPattern = re.compile(re.escape(self.prefix) + r"[0-9]+\.bin$")
+        for aFileName in os.listdir(self.directory):
+          if aPattern.match(aFileName):
+            os.remove(os.path.join(self.directory, aFileName))
+
+    def Write( self, theChunks ):
+        for aChunk in theChunks:
+          self.sink.write(aChunk)
+          self.size += len(aChunk)
+
+    def AddRecord( self, theKind, theEntry, thePacker ):
+        """
+        Writes the packed record of the object with theEntry
+        """
+        if self.directory:
+          aFileName = self.prefix + str(len(self.toc) + 1) + ".bin"
+          with open(os.path.join(self.directory, aFileName), "wb") as aFile:
+            for aChunk in thePacker.chunks:
+              aFile.write(aChunk)
+          self.toc.append((theKind, theEntry, aFileName, 0, thePacker.size))
+        else:
+          self.toc.append((theKind, theEntry, "", self.size, thePacker.size))
+          self.Write(thePacker.chunks)
+
+    def AddBlob( self, theData ):
+        """
+        Appends a blob if the same content is not written yet, returns its key (empty for no data)
+        """
+        if not len(theData):
+          return ""
+        aKey = hashlib.sha1(theData).hexdigest()
+        if not aKey in self.blobs:
+          self.blobs.add(aKey)
+          aPacker = Packer()
+          aPacker.Bytes(theData)
+          self.AddRecord(BLOB, aKey, aPacker)
+        return aKey
+
+    def AddShape( self, theEntry, theTick, theStream, theOldStream ):
+        """
+        Appends a shape: tick, keys of blobs of current and old shapes in OCCT binary BRep format
+        """
+        aPacker = Packer()
+        aPacker.Int(theTick)
+        aPacker.String(self.AddBlob(theStream))
+        aPacker.String(self.AddBlob(theOldStream))
+        self.AddRecord(SHAPE, theEntry, aPacker)
+
+    def AddGroup( self, theEntry, theSelectionType, theSelection, theSelectionOld ):
+        """
+        Appends a group: selection type, current and old selected indices
+        """
+        aPacker = Packer()
+        aPacker.Int(theSelectionType)
+        aPacker.Array('i', theSelection)
+        aPacker.Array('i', theSelectionOld)
+        self.AddRecord(GROUP, theEntry, aPacker)
+
+    def AddField( self, theEntry, theSelectionType, theValuesType, theComponents, theSteps,
+                  theSelection, theSelectionOld ):
+        """
+        Appends a field: same as group plus values type, components and steps,
+        theSteps is a list of (step ID, stamp ID, values)
+        """
+        aPacker = Packer()
+        aPacker.Int(theSelectionType)
+        aPacker.Int(theValuesType)
+        aPacker.Int(len(theComponents))
+        for aComp in theComponents:
+          aPacker.String(aComp)
+        aPacker.Int(len(theSteps))
+        for aStepID, aStampID, aValues in theSteps:
+          aPacker.Int(aStepID)
+          aPacker.Int(aStampID)
+          if theValuesType == STRING_VALUES:
+            if not isinstance(aValues, StringValues):
+              aValues = StringValues(aValues)
+            aPacker.Array('q', aValues.offsets)
+            aPacker.Bytes(aValues.blob)
+          else:
+            aPacker.Array(valuesTypeCode(theValuesType), aValues)
+        aPacker.Array('i', theSelection)
+        aPacker.Array('i', theSelectionOld)
+        self.AddRecord(FIELD, theEntry, aPacker)
+
+    def Close( self ):
+        """
+        Finishes the stream: writes the TOC and the footer
+        """
+        aTOCOffset = self.size
+        for aKind, anEntry, aFileName, anOffset, aSize in self.toc:
+          anEntryBytes = anEntry.encode()
+          aFileBytes = aFileName.encode()
+          self.Write([struct.pack("<BI", aKind, len(anEntryBytes)), anEntryBytes,
+                      struct.pack("<I", len(aFileBytes)), aFileBytes,
+                      struct.pack("<QQ", anOffset, aSize)])
+        self.Write([__footer__.pack(aTOCOffset, len(self.toc))])
+
+    pass
+
+class Reader:
+    """
+    Reads the TOC of the binary stream and gives access to the records.
+    theDirectory is where the records files are located in the multi-file mode.
+    """
+    def __init__ ( self, theStream, theDirectory = None ):
+        self.buffer = memoryview(theStream)
+        self.directory = theDirectory
+        if not isBinary(self.buffer):
+          raise ValueError("Not a SHAPER-STUDY binary stream")
+        self.version = struct.unpack_from("<I", self.buffer, len(MAGIC))[0]
+        if self.version != VERSION:
+          raise ValueError("Unsupported version " + str(self.version) + " of SHAPER-STUDY data")
+        aTOCOffset, aNum = __footer__.unpack_from(self.buffer, len(self.buffer) - __footer__.size)
+        self.toc = [] # list of (kind, entry, file name, offset, size)
+        aPos = aTOCOffset
+        for anIndex in range(aNum):
+          aKind, anEntrySize = struct.unpack_from("<BI", self.buffer, aPos)
+          aPos += 5
+          anEntry = bytes(self.buffer[aPos:aPos + anEntrySize]).decode()
+          aPos += anEntrySize
+          aFileSize = struct.unpack_from("<I", self.buffer, aPos)[0]
+          aPos += 4
+          aFileName = bytes(self.buffer[aPos:aPos + aFileSize]).decode()
+          aPos += aFileSize
+          anOffset, aSize = struct.unpack_from("<QQ", self.buffer, aPos)
+          aPos += 16
+          self.toc.append((aKind, anEntry, aFileName, anOffset, aSize))
+
+    def Record( self, theFileName, theOffset, theSize ):
+        """
+        Returns payload of the record, reads the record file in the multi-file mode
+        """
+        if theFileName:
+          with open(os.path.join(self.directory or "", theFileName), "rb") as aFile:
+            aFile.seek(theOffset)
+            return aFile.read(theSize)
+        return self.buffer[theOffset:theOffset + theSize]
+
+    def Records( self ):
+        """
+        Iterates (kind, entry, unpacker of the record payload), one record in memory at a time.
+        Blob records always go before records referencing them.
+        """
+        for aKind, anEntry, aFileName, anOffset, aSize in self.toc:
+          yield aKind, anEntry, Unpacker(self.Record(aFileName, anOffset, aSize))
+
+    pass
+
+def readBlob(theUnpacker):
+    """
+    Returns content of the blob record
+    """
+    return theUnpacker.Bytes()
+
+def readShape(theUnpacker, theBlobs):
+    """
+    Returns (tick, current stream, old stream) of the shape record,
+    theBlobs is a dictionary of already read blobs contents by their keys
+    """
+    aTick = theUnpacker.Int()
+    aStream = theBlobs.get(theUnpacker.String(), b"")
+    anOldStream = theBlobs.get(theUnpacker.String(), b"")
+    return aTick, aStream, anOldStream
+
+def readGroup(theUnpacker):
+    """
+    Returns (selection type, selection, old selection) of the group record
+    """
+    aSelType = theUnpacker.Int()
+    aSelection = theUnpacker.Array('i')
+    aSelectionOld = theUnpacker.Array('i')
+    return aSelType, aSelection, aSelectionOld
+
+def readField(theUnpacker):
+    """
+    Returns (selection type, values type, components, steps, selection, old selection)
+    of the field record, steps is a list of (step ID, stamp ID, values)
+    """
+    aSelType = theUnpacker.Int()
+    aValType = theUnpacker.Int()
+    aComponents = [theUnpacker.String() for aComp in range(theUnpacker.Int())]
+    aSteps = []
+    for aStep in range(theUnpacker.Int()):
+      aStepID = theUnpacker.Int()
+      aStampID = theUnpacker.Int()
+      if aValType == STRING_VALUES:
+        anOffsets = theUnpacker.Array('q')
+        aValues = StringValues(theOffsets = anOffsets, theBlob = theUnpacker.Bytes())
+      else:
+        aValues = theUnpacker.Array(valuesTypeCode(aValType))
+      aSteps.append((aStepID, aStampID, aValues))
+    aSelection = theUnpacker.Array('i')
+    aSelectionOld = theUnpacker.Array('i')
+    return aSelType, aValType, aComponents, aSteps, aSelection, aSelectionOld
@@ -33,6 +33,7 @@ __all__ = [
     "getNS",
     "getLCC",
     "getEngine",
+    "getLocal",
     "getStudy",
     "getEngineIOR",
     "findOrCreateComponent",
@@ -40,7 +41,7 @@ __all__ = [
     ]
 
 
-from omniORB import CORBA
+from omniORB import CORBA, PortableServer
 from salome.kernel.SALOME_NamingServicePy import SALOME_NamingServicePy_i
 from salome.kernel.LifeCycleCORBA import LifeCycleCORBA
 from salome.kernel import SALOMEDS
@@ -101,6 +102,28 @@ def getPOA():
         pass
     return __poa__
 
+###
+# Get the local servant of a CORBA object reference (None if the object is not local)
+###
+def getServant(theObject):
+    try:
+        return getPOA().reference_to_servant(theObject)
+    except:
+        return None
+
+###
+# Get the object to call methods of theObject in the fastest way: the local servant
+# of the collocated object (direct python call, without CORBA) or the object itself
+# if it is a remote reference (or a servant already)
+###
+def getLocal(theObject):
+    if theObject is None or isinstance(theObject, PortableServer.Servant):
+        return theObject
+    aServant = getServant(theObject)
+    if aServant is None:
+        return theObject
+    return aServant
+
 ###
 # Get naming service instance
 ###
@@ -82,20 +82,21 @@ class shaperBuilder(SHAPERSTUDY.SHAPERSTUDY):
         if not created:
             created = True
             GEOM._objref_GEOM_Gen.__init__(self, *args)
-            from SHAPERSTUDY_utils import moduleName
+            from SHAPERSTUDY_utils import moduleName, getLocal
             SALOME_DriverPy.SALOME_DriverPy_i.__init__(self, moduleName())
+            # operations of the engine running in the same process are called directly, without CORBA
             self.BasicOp  = None
             self.CurvesOp = None
             self.PrimOp   = None
-            self.ShapesOp = self.GetIShapesOperations()
+            self.ShapesOp = getLocal(self.GetIShapesOperations())
             self.HealOp   = None
             self.InsertOp = None
             self.BoolOp   = None
             self.TrsfOp   = None
             self.LocalOp  = None
-            self.MeasuOp  = self.GetIMeasureOperations()
+            self.MeasuOp  = getLocal(self.GetIMeasureOperations())
             self.BlocksOp = None
-            self.GroupOp  = self.GetIGroupOperations()
+            self.GroupOp  = getLocal(self.GetIGroupOperations())
             self.FieldOp  = None
             pass
 
@@ -137,6 +138,14 @@ class shaperBuilder(SHAPERSTUDY.SHAPERSTUDY):
         RaiseIfFailed("GetSubShapeIndex", self.ShapesOp)
         return anID
 
+    def GetSubShapesIDs(self, aShape, aSubShapes):
+        """
+        Obtain a list of unique IDs of sub-shapes aSubShapes inside aShape
+        """
+        ListID = self.ShapesOp.GetSubShapeIndices(aShape, aSubShapes)
+        RaiseIfFailed("GetSubShapeIndices", self.ShapesOp)
+        return ListID
+
     def MinDistance(self, theVertex1, theVertex2):
         """
         Get minimal distance between the given vertices.
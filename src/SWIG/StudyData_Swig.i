@@ -28,14 +28,19 @@
 #include <Standard_ErrorHandler.hxx>
 #include <stdexcept>
 
-static PyObject* setOCCException(Standard_Failure& ex)
+static std::string getOCCMessage(Standard_Failure& ex)
 {
   std::string msg(ex.DynamicType()->Name());
   if ( ex.GetMessageString() && strlen( ex.GetMessageString() )) {
     msg += ": ";
     msg += ex.GetMessageString();
   }
-  PyErr_SetString(PyExc_Exception, msg.c_str() );
+  return msg;
+}
+
+static PyObject* setOCCException(Standard_Failure& ex)
+{
+  PyErr_SetString(PyExc_Exception, getOCCMessage(ex).c_str() );
   return NULL;
 }
 %}
@@ -54,6 +59,61 @@ static PyObject* setOCCException(Standard_Failure& ex)
   }
 }
 
+// long calls that do not use python objects are performed with released GIL,
+// so other python threads (e.g. CORBA requests) are not blocked meanwhile;
+// the StudyData objects lock their state, so they may be used in parallel
+%define RELEASE_GIL(Method)
+%exception Method
+{
+  bool isFailed = false;
+  std::string anError;
+  Py_BEGIN_ALLOW_THREADS
+  try {
+    OCC_CATCH_SIGNALS;
+    $action }
+  catch (Standard_Failure& ex) {
+    isFailed = true;
+    anError = getOCCMessage(ex);
+  }
+  catch (std::exception& ex) {
+    isFailed = true;
+    anError = ex.what();
+  }
+  Py_END_ALLOW_THREADS
+  if (isFailed) {
+    PyErr_SetString(PyExc_Exception, anError.c_str() );
+    return NULL;
+  }
+}
+%enddef
+
+// reading and writing of BRep streams, building of groups
+RELEASE_GIL(StudyData_Object::type)
+RELEASE_GIL(StudyData_Object::shape)
+RELEASE_GIL(StudyData_Object::shapeStream)
+RELEASE_GIL(StudyData_Object::oldShapeStream)
+RELEASE_GIL(StudyData_Object::shapeBinStream)
+RELEASE_GIL(StudyData_Object::oldShapeBinStream)
+RELEASE_GIL(StudyData_Object::updateShape)
+RELEASE_GIL(StudyData_Object::SetShapeByPointer)
+RELEASE_GIL(StudyData_Object::groupShape)
+RELEASE_GIL(StudyData_Object::ReadShapes)
+// explode, sorting, indices and measurements of shapes
+RELEASE_GIL(StudyData_Operation::GetAllSubShapesIDs)
+RELEASE_GIL(StudyData_Operation::GetSharedShapes)
+RELEASE_GIL(StudyData_Operation::GetSubShapeIndex)
+RELEASE_GIL(StudyData_Operation::GetSubShapeIndices)
+RELEASE_GIL(StudyData_Operation::GetSubShape)
+RELEASE_GIL(StudyData_Operation::NumberOfSubShapes)
+RELEASE_GIL(StudyData_Operation::ExtractSubShapes)
+RELEASE_GIL(StudyData_Operation::PointCoordinates)
+RELEASE_GIL(StudyData_Operation::MinDistance)
+RELEASE_GIL(StudyData_Operation::NumberOfEdges)
+RELEASE_GIL(StudyData_Operation::NumberOfFaces)
+RELEASE_GIL(StudyData_Operation::GetTopologyIndex)
+RELEASE_GIL(StudyData_Operation::GetTolerance)
+RELEASE_GIL(StudyData_Operation::GetVertexByIndex)
+
 // standard definitions
 %include "typemaps.i"
 %include "std_string.i"
@@ -61,6 +121,20 @@ static PyObject* setOCCException(Standard_Failure& ex)
 
 #define StudyData_EXPORT
 
+// binary data is passed as bytes (or any other buffer) instead of unicode string
+%typemap(in) const StudyData_Binary& (std::string temp) {
+  Py_buffer aView;
+  if (PyObject_GetBuffer($input, &aView, PyBUF_SIMPLE) != 0)
+    SWIG_fail;
+  temp.assign((const char*)aView.buf, aView.len);
+  PyBuffer_Release(&aView);
+  $1 = &temp;
+}
+%typemap(out) StudyData_Binary {
+  $result = PyBytes_FromStringAndSize((&$1)->data(), (&$1)->size());
+}
+
+%include "StudyData.h"
 %include "StudyData_Object.h"
 %include "StudyData_Operation.h"
 %include "StudyData_XAO.h"
@@ -30,4 +30,9 @@
 #  define StudyData_EXPORT
 #endif
 
+#include <string>
+
+/// Binary data (e.g. shape in OCCT binary BRep format), in Python it is bytes
+typedef std::string StudyData_Binary;
+
 #endif // StudyData_H
@@ -24,152 +24,791 @@
 #include <BRep_Builder.hxx>
 #include <BRepTools.hxx>
 #include <BRepBuilderAPI_Copy.hxx>
+#include <BinTools.hxx>
 
-StudyData_Object::StudyData_Object(const std::string theFile)
+#include <Standard_Failure.hxx>
+
+#include <sstream>
+#include <map>
+#include <set>
+#include <unordered_map>
+#include <algorithm>
+#include <cstring>
+#include <cstdlib>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <atomic>
+
+// all existing objects by addresses of their current shapes
+static std::map<const TopoDS_Shape*, const StudyData_Object*> MY_OBJECTS;
+// protects MY_OBJECTS and the numbers of users of objects; it is never locked for long,
+// the state of each object is protected by its own mutex
+static std::mutex MY_OBJECTS_MUTEX;
+// notified when an object found in MY_OBJECTS is released
+static std::condition_variable MY_OBJECTS_RELEASED;
+
+// number of threads reading shapes in ReadShapes, negative for the number of cores;
+// by default shapes are read on demand only
+static int MY_READ_THREADS = 0;
+
+// FNV-1a 64 hashing constants
+static const unsigned long long FNV_OFFSET = 14695981039346656037ULL;
+static const unsigned long long FNV_PRIME = 1099511628211ULL;
+
+/// Section of the shape BRep text stream: its name, number of items, digest and position
+struct StudyData_Section
+{
+  std::string myName; // empty for the stream header
+  int myCount;
+  unsigned long long myDigest;
+  size_t myStart, myEnd;
+
+  StudyData_Section() : myCount(0), myDigest(0), myStart(0), myEnd(0) {}
+};
+
+/// Fingerprint of the shape BRep text stream: digests and sizes of all sections
+typedef std::vector<StudyData_Section> StudyData_Fingerprint;
+
+/// Version of a shape shared by all objects having the same BRep text stream
+struct StudyData_Blob
+{
+  std::string myText;
+  unsigned long long myDigest; // digest of the text
+  TopoDS_Shape myShape; // shape read from the text, null if not read yet
+  StudyData_Fingerprint myFingerprint; // empty if not computed yet
+  StudyData_BinaryPtr myBinary; // the shape in OCCT binary BRep format, null if not written yet
+
+  ~StudyData_Blob();
+};
+
+// all existing blobs by digests of their texts
+static std::map<unsigned long long, std::weak_ptr<StudyData_Blob> > MY_BLOBS;
+// protects MY_BLOBS and the shapes and fingerprints of blobs computed on demand;
+// recursive since a blob may be destroyed while MY_BLOBS is changed
+static std::recursive_mutex MY_BLOBS_MUTEX;
+
+StudyData_Blob::~StudyData_Blob()
+{
+  std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+  std::map<unsigned long long, std::weak_ptr<StudyData_Blob> >::iterator aFound =
+    MY_BLOBS.find(myDigest);
+  if (aFound != MY_BLOBS.end() && aFound->second.expired())
+    MY_BLOBS.erase(aFound);
+}
+
+// all existing binary streams by digests of their contents, protected by MY_BLOBS_MUTEX
+static std::map<unsigned long long, std::weak_ptr<const StudyData_Binary> > MY_BINARIES;
+
+// returned for the null shape
+static const std::string EMPTY_TEXT;
+
+// returns the digest of the text or binary data
+static unsigned long long Digest(const std::string& theData)
+{
+  unsigned long long aDigest = FNV_OFFSET;
+  for(std::string::const_iterator aChar = theData.cbegin(); aChar != theData.cend(); aChar++)
+    aDigest = (aDigest ^ (unsigned char)*aChar) * FNV_PRIME;
+  return aDigest;
+}
+
+// returns the blob of theText shared with all objects having the same text (null for empty text)
+static StudyData_BlobPtr Intern(const std::string& theText,
+                                const TopoDS_Shape& theShape = TopoDS_Shape())
 {
-  std::istringstream streamBrep(theFile.c_str());
+  if (theText.empty())
+    return StudyData_BlobPtr();
+  unsigned long long aDigest = Digest(theText);
+
+  std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+  std::weak_ptr<StudyData_Blob>& aStored = MY_BLOBS[aDigest];
+  StudyData_BlobPtr aBlob = aStored.lock();
+  if (!aBlob || aBlob->myText != theText) { // not stored yet or collision of digests
+    bool isCollision = (bool)aBlob;
+    aBlob.reset(new StudyData_Blob);
+    aBlob->myText = theText;
+    aBlob->myDigest = aDigest;
+    if (!isCollision) // in case of collision the blob is just not shared
+      aStored = aBlob;
+  }
+  if (aBlob->myShape.IsNull())
+    aBlob->myShape = theShape;
+  return aBlob;
+}
+
+// reads the shape from the BRep text format
+static TopoDS_Shape ReadText(const std::string& theText)
+{
+  TopoDS_Shape aShape;
+  std::istringstream streamBrep(theText.c_str());
   BRep_Builder aBuilder;
-  BRepTools::Read(myShape, streamBrep, aBuilder);
+  BRepTools::Read(aShape, streamBrep, aBuilder);
+  return aShape;
+}
+
+// returns the shape of theBlob, reads it from the text if it is not read yet
+static TopoDS_Shape BlobShape(const StudyData_BlobPtr& theBlob)
+{
+  {
+    std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+    if (!theBlob->myShape.IsNull())
+      return theBlob->myShape;
+  }
+  TopoDS_Shape aShape = ReadText(theBlob->myText); // the text is never changed
+  std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+  if (theBlob->myShape.IsNull()) // not read meanwhile by another object
+    theBlob->myShape = aShape;
+  return theBlob->myShape;
+}
+
+// writes the shape in the BRep text format
+static std::string WriteText(const TopoDS_Shape& theShape)
+{
+  std::ostringstream aStreamBrep;
+  if (!theShape.IsNull()) {
+    BRepTools::Write(theShape, aStreamBrep);
+  }
+  return aStreamBrep.str();
+}
+
+// writes the shape in OCCT binary BRep format
+static StudyData_Binary WriteBinary(const TopoDS_Shape& theShape)
+{
+  std::ostringstream aStreamBin(std::ios::out | std::ios::binary);
+  if (!theShape.IsNull()) {
+    BinTools::Write(theShape, aStreamBin);
+  }
+  return aStreamBin.str();
+}
+
+// reads the shape from OCCT binary BRep format, returns null shape for empty stream
+static TopoDS_Shape ReadBinary(const StudyData_Binary& theStream)
+{
+  TopoDS_Shape aShape;
+  if (!theStream.empty()) {
+    std::istringstream aStreamBin(theStream, std::ios::in | std::ios::binary);
+    BinTools::Read(aShape, aStreamBin);
+  }
+  return aShape;
+}
+
+// removes the expired binary stream from MY_BINARIES
+static void ReleaseBinary(const unsigned long long theDigest, const StudyData_Binary* theStream)
+{
+  {
+    std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+    std::map<unsigned long long, std::weak_ptr<const StudyData_Binary> >::iterator aFound =
+      MY_BINARIES.find(theDigest);
+    if (aFound != MY_BINARIES.end() && aFound->second.expired())
+      MY_BINARIES.erase(aFound);
+  }
+  delete theStream;
+}
+
+// returns theStream shared with all objects having the same binary stream (null for empty one)
+static StudyData_BinaryPtr InternBinary(const StudyData_Binary& theStream)
+{
+  if (theStream.empty())
+    return StudyData_BinaryPtr();
+  unsigned long long aDigest = Digest(theStream);
+
+  std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+  std::weak_ptr<const StudyData_Binary>& aStored = MY_BINARIES[aDigest];
+  StudyData_BinaryPtr aBinary = aStored.lock();
+  if (!aBinary || *aBinary != theStream) { // not stored yet or collision of digests
+    bool isCollision = (bool)aBinary;
+    aBinary.reset(new StudyData_Binary(theStream),
+      [aDigest](const StudyData_Binary* theBinary) { ReleaseBinary(aDigest, theBinary); });
+    if (!isCollision) // in case of collision the stream is just not shared
+      aStored = aBinary;
+  }
+  return aBinary;
+}
+
+// returns the binary stream of theShape: known one, the one of the same shape version in theBlob,
+// or written now (stored in theBlob for other objects); null for the null shape
+static StudyData_BinaryPtr BinaryOf(const TopoDS_Shape& theShape, const StudyData_BlobPtr& theBlob,
+                                    const StudyData_BinaryPtr& theKnown)
+{
+  if (theKnown || theShape.IsNull())
+    return theKnown;
+  if (theBlob) {
+    std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+    if (theBlob->myBinary)
+      return theBlob->myBinary;
+  }
+  StudyData_BinaryPtr aBinary = InternBinary(WriteBinary(theShape));
+  if (theBlob) {
+    std::lock_guard<std::recursive_mutex> aLock(MY_BLOBS_MUTEX);
+    if (!theBlob->myBinary) // not written meanwhile by another object
+      theBlob->myBinary = aBinary;
+  }
+  return aBinary;
+}
+
+// names of the sections of the BRep text format
+static const char* SECTIONS[] = {"Locations", "Curve2ds", "Curves", "Polygon3D",
+  "PolygonOnTriangulations", "Surfaces", "Triangulations", "TShapes", 0};
+
+// returns the number of items if the line at thePos of theStream is a section header,
+// otherwise -1
+static int SectionHeader(const std::string& theStream, const size_t thePos, std::string& theName)
+{
+  for(int aSection = 0; SECTIONS[aSection]; aSection++) {
+    size_t aLen = strlen(SECTIONS[aSection]);
+    if (theStream.compare(thePos, aLen, SECTIONS[aSection]) == 0 &&
+        thePos + aLen < theStream.size() && theStream[thePos + aLen] == ' ') {
+      theName = SECTIONS[aSection];
+      return atoi(theStream.c_str() + thePos + aLen + 1);
+    }
+  }
+  return -1;
+}
+
+// computes digests of sections of the BRep text stream
+static void MakeFingerprint(const std::string& theStream, StudyData_Fingerprint& theFingerprint)
+{
+  theFingerprint.clear();
+  theFingerprint.push_back(StudyData_Section()); // the stream header
+  unsigned long long aDigest = FNV_OFFSET;
+  bool isLineStart = true;
+  for(size_t aPos = 0; aPos < theStream.size(); aPos++) {
+    std::string aName;
+    int aCount;
+    if (isLineStart && (aCount = SectionHeader(theStream, aPos, aName)) >= 0) {
+      theFingerprint.back().myDigest = aDigest;
+      theFingerprint.back().myEnd = aPos;
+      StudyData_Section aSection;
+      aSection.myName = aName;
+      aSection.myCount = aCount;
+      aSection.myStart = aPos;
+      theFingerprint.push_back(aSection);
+      aDigest = FNV_OFFSET;
+    }
+    char aChar = theStream[aPos];
+    aDigest = (aDigest ^ (unsigned char)aChar) * FNV_PRIME;
+    isLineStart = aChar == '\n';
+  }
+  theFingerprint.back().myDigest = aDigest;
+  theFingerprint.back().myEnd = theStream.size();
+}
+
+// returns true if all numbers of two streams have the minimal difference
+static bool IsSimilar(std::istream& theMyStr, std::istream& theFileStr)
+{
+  double aMyNum, aFileNum;
+  std::string aBuf1, aBuf2;
+  while(theMyStr && theFileStr) {
+    if (theMyStr>>aMyNum) {
+      if (theFileStr>>aFileNum) {
+        if (std::abs(aMyNum - aFileNum) > 1.e-9)
+          break; // different numbers
+      } else {
+        break; // number and not number
+      }
+    } else if (theFileStr>>aFileNum) {
+      break; // number and not number
+    } else { // read two non-numbers
+      theMyStr.clear();
+      theMyStr>>aBuf1;
+      theFileStr.clear();
+      theFileStr>>aBuf2;
+      if (aBuf1 != aBuf2)
+        break; // strings are different
+    }
+  }
+  return !theMyStr || !theFileStr; // both get to the end with equal content
+}
+
+// returns true if streams have the same topology and the minimal difference in numbers;
+// only sections with different digests are compared number by number
+static bool IsSimilar(const std::string& theMyStream, const StudyData_Fingerprint& theMyPrint,
+                      const std::string& theFile, const StudyData_Fingerprint& theFilePrint)
+{
+  if (theMyPrint.size() != theFilePrint.size())
+    return false;
+  StudyData_Fingerprint::const_iterator aMy = theMyPrint.cbegin(), aFile = theFilePrint.cbegin();
+  for(; aMy != theMyPrint.cend(); aMy++, aFile++) {
+    if (aMy->myName != aFile->myName || aMy->myCount != aFile->myCount)
+      return false; // different topology
+    if (aMy->myDigest == aFile->myDigest)
+      continue;
+    std::istringstream aMyStr(theMyStream.substr(aMy->myStart, aMy->myEnd - aMy->myStart));
+    std::istringstream aFileStr(theFile.substr(aFile->myStart, aFile->myEnd - aFile->myStart));
+    if (!IsSimilar(aMyStr, aFileStr))
+      return false;
+  }
+  return true;
+}
+
+StudyData_Object::StudyData_Object(const std::string theFile)
+{
+  myStream = Intern(theFile);
+  if (myStream)
+    myShape = BlobShape(myStream);
   myTick = 1;
-  myStream = theFile;
+  myUsers = 0;
+  std::lock_guard<std::mutex> aLock(MY_OBJECTS_MUTEX);
+  MY_OBJECTS[&myShape] = this;
 }
 
 StudyData_Object::StudyData_Object()
 {
   myTick = 0; // when shape is defined, it will be increased to 1
+  myUsers = 0;
+  std::lock_guard<std::mutex> aLock(MY_OBJECTS_MUTEX);
+  MY_OBJECTS[&myShape] = this;
+}
+
+StudyData_Object::~StudyData_Object()
+{
+  // the object can not be found any more, but it may be still used by other threads
+  std::unique_lock<std::mutex> aLock(MY_OBJECTS_MUTEX);
+  MY_OBJECTS.erase(&myShape);
+  MY_OBJECTS_RELEASED.wait(aLock, [this]() { return myUsers == 0; });
+}
+
+// computes the map of sub-shapes of theShape of theType or of all types if it is TopAbs_SHAPE
+static StudyData_ShapesMap MapShapes(const TopoDS_Shape& theShape, const int theType)
+{
+  std::shared_ptr<TopTools_IndexedMapOfShape> aMap(new TopTools_IndexedMapOfShape);
+  if (theType == TopAbs_SHAPE)
+    TopExp::MapShapes(theShape, *aMap);
+  else
+    TopExp::MapShapes(theShape, TopAbs_ShapeEnum(theType), *aMap);
+  return aMap;
+}
+
+StudyData_ObjectPtr StudyData_Object::find(const long long theShape)
+{
+  std::lock_guard<std::mutex> aLock(MY_OBJECTS_MUTEX);
+  std::map<const TopoDS_Shape*, const StudyData_Object*>::const_iterator aFound =
+    MY_OBJECTS.find((const TopoDS_Shape*)theShape);
+  if (aFound == MY_OBJECTS.end())
+    return StudyData_ObjectPtr();
+  aFound->second->myUsers++;
+  return StudyData_ObjectPtr(aFound->second, [](const StudyData_Object* theObject) {
+    std::lock_guard<std::mutex> aLock(MY_OBJECTS_MUTEX);
+    if (--theObject->myUsers == 0)
+      MY_OBJECTS_RELEASED.notify_all();
+  });
+}
+
+TopoDS_Shape StudyData_Object::shapeOf(const long long theShape)
+{
+  if (!theShape)
+    return TopoDS_Shape();
+  StudyData_ObjectPtr anObj = find(theShape);
+  if (!anObj)
+    return *((const TopoDS_Shape*)theShape);
+  std::lock_guard<std::recursive_mutex> aLock(anObj->myMutex);
+  anObj->readShape();
+  return anObj->myShape;
+}
+
+StudyData_ShapesMap StudyData_Object::subShapes(const long long theShape, const int theType)
+{
+  StudyData_ObjectPtr anObj = find(theShape);
+  if (!anObj || theType < 0 || theType > TopAbs_SHAPE)
+    return MapShapes(shapeOf(theShape), theType);
+  std::lock_guard<std::recursive_mutex> aLock(anObj->myMutex);
+  anObj->readShape();
+  StudyData_ShapesMap& aMap = anObj->mySubShapes[theType];
+  if (!aMap) // not computed yet
+    aMap = MapShapes(anObj->myShape, theType);
+  return aMap;
+}
+
+StudyData_ShapesList StudyData_Object::sortedSubShapes(const long long theShape,
+                                                       const int theType)
+{
+  StudyData_ObjectPtr anObj = find(theShape);
+  if (!anObj || theType < 0 || theType > TopAbs_SHAPE + 1)
+    return StudyData_ShapesList();
+  std::lock_guard<std::recursive_mutex> aLock(anObj->myMutex);
+  anObj->readShape();
+  return anObj->mySortedSubShapes[theType];
+}
+
+void StudyData_Object::setSortedSubShapes(const long long theShape, const TopoDS_Shape& theCurrent,
+  const int theType, const StudyData_ShapesList& theList)
+{
+  StudyData_ObjectPtr anObj = find(theShape);
+  if (!anObj || theType < 0 || theType > TopAbs_SHAPE + 1)
+    return;
+  std::lock_guard<std::recursive_mutex> aLock(anObj->myMutex);
+  if (anObj->myShape.IsEqual(theCurrent)) // not changed while the list was computed
+    anObj->mySortedSubShapes[theType] = theList;
+}
+
+void StudyData_Object::clearSubShapes() const
+{
+  for(int aType = 0; aType <= TopAbs_SHAPE; aType++)
+    mySubShapes[aType].reset(); // maps used now are kept till the end of usage
+  for(int aType = 0; aType <= TopAbs_SHAPE + 1; aType++)
+    mySortedSubShapes[aType].reset();
 }
 
 int StudyData_Object::type() const
 {
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  readShape();
   if (myShape.IsNull())
     return 8; // GEOM.SHAPE
   return (int) myShape.ShapeType();
 }
 
+void StudyData_Object::readShape() const
+{
+  // called under the lock of the object only, so other objects are not blocked while reading
+  if (myBinStream && myShape.IsNull()) {
+    myShape = ReadBinary(*myBinStream);
+    clearSubShapes();
+  }
+}
+
+void StudyData_Object::readOldShape() const
+{
+  if (myOldBinStream && myOldShape.IsNull())
+    myOldShape = ReadBinary(*myOldBinStream);
+}
+
+const std::string& StudyData_Object::textStream() const
+{
+  readShape();
+  if (!myStream && !myShape.IsNull()) // shape was read from the binary stream or set by pointer
+    myStream = Intern(WriteText(myShape), myShape);
+  return myStream ? myStream->myText : EMPTY_TEXT;
+}
+
 std::string StudyData_Object::shapeStream() const
 {
-  return myStream;
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  return textStream();
 }
 
 std::string StudyData_Object::oldShapeStream() const
 {
-  return myOldStream.empty() ? myStream : myOldStream;
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  readOldShape();
+  if (!myOldStream && !myOldShape.IsNull()) // shape was read from the binary stream or set by pointer
+    myOldStream = Intern(WriteText(myOldShape), myOldShape);
+  return myOldStream ? myOldStream->myText : textStream();
+}
+
+StudyData_Binary StudyData_Object::shapeBinStream() const
+{
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  myBinStream = BinaryOf(myShape, myStream, myBinStream); // written once, then kept
+  return myBinStream ? *myBinStream : StudyData_Binary();
+}
+
+StudyData_Binary StudyData_Object::oldShapeBinStream() const
+{
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  myOldBinStream = BinaryOf(myOldShape, myOldStream, myOldBinStream);
+  return myOldBinStream ? *myOldBinStream : StudyData_Binary();
+}
+
+void StudyData_Object::SetShapeByBinStream(const StudyData_Binary& theStream,
+                                           const StudyData_Binary& theOldStream)
+{
+  // shapes and text streams are generated on demand
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  myBinStream = InternBinary(theStream);
+  myOldBinStream = InternBinary(theOldStream);
+  myShape.Nullify();
+  myOldShape.Nullify();
+  clearSubShapes();
+  myStream.reset();
+  myOldStream.reset();
+  myTick = myOldBinStream ? 2 : 1;
 }
 
 long long StudyData_Object::shape() const
 {
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  readShape();
   return ((long long)(&myShape));
 }
 
 void StudyData_Object::updateShape(const std::string theFile)
 {
-  if (myStream == theFile) { // absolutely identical shapes, no need to store
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  const std::string& aMyText = textStream();
+  if (aMyText == theFile) { // absolutely identical shapes, no need to store
     return;
   }
-  long aDelta = (long)myStream.size() - (long)theFile.size();
+  StudyData_Fingerprint aFingerprint;
+  long aDelta = (long)aMyText.size() - (long)theFile.size();
   aDelta = aDelta < 0 ? -aDelta : aDelta;
-  long aSum = (long)myStream.size() + (long)theFile.size();
+  long aSum = (long)aMyText.size() + (long)theFile.size();
   if (double(aDelta) / aSum < 0.05) { // size-difference is less than 10%
-    // check numbers have the minimal differnce
-    std::istringstream aMyStr(myStream);
-    std::istringstream aFileStr(theFile);
-    double aMyNum, aFileNum;
-    std::string aBuf1, aBuf2;
-    while(aMyStr && aFileStr) {
-      if (aMyStr>>aMyNum) {
-        if (aFileStr>>aFileNum) {
-          if (std::abs(aMyNum - aFileNum) > 1.e-9)
-            break; // different numbers
-        } else {
-          break; // number and not number
-        }
-      } else if (aFileStr>>aFileNum) {
-        break; // number and not number
-      } else { // read two non-numbers
-        aMyStr.clear();
-        aMyStr>>aBuf1;
-        aFileStr.clear();
-        aFileStr>>aBuf2;
-        if (aBuf1 != aBuf2)
-          break; // strings are different
-      }
+    // compare digests of sections, numbers of sections with different digests
+    // are checked to have the minimal difference
+    MakeFingerprint(theFile, aFingerprint);
+    StudyData_Fingerprint aMyFingerprint; // copied since the blob is shared with other objects
+    {
+      std::lock_guard<std::recursive_mutex> aBlobLock(MY_BLOBS_MUTEX);
+      aMyFingerprint = myStream->myFingerprint;
+    }
+    if (aMyFingerprint.empty()) {
+      MakeFingerprint(aMyText, aMyFingerprint);
+      std::lock_guard<std::recursive_mutex> aBlobLock(MY_BLOBS_MUTEX);
+      myStream->myFingerprint = aMyFingerprint;
     }
-    if (!aMyStr || !aFileStr) // both get to the end with equal content
+    if (IsSimilar(aMyText, aMyFingerprint, theFile, aFingerprint))
       return;
   }
 
-  // update the current shape
-  std::istringstream streamBrep(theFile.c_str());
-  BRep_Builder aBuilder;
-  myOldShape = myShape;
-  BRepTools::Read(myShape, streamBrep, aBuilder);
+  // update the current shape, the version is shared with other objects having the same one
+  StudyData_BlobPtr aNewStream = Intern(theFile);
+  TopoDS_Shape aNewShape;
+  if (aNewStream) {
+    aNewShape = BlobShape(aNewStream);
+    std::lock_guard<std::recursive_mutex> aBlobLock(MY_BLOBS_MUTEX);
+    if (aNewStream->myFingerprint.empty())
+      aNewStream->myFingerprint.swap(aFingerprint);
+  }
+  myOldShape = myShape; // the old shape is replaced by the current one
+  myShape = aNewShape;
+  clearSubShapes();
   myTick++;
   myOldStream = myStream;
-  myStream = theFile;
+  myStream = aNewStream;
+  myOldBinStream = myBinStream;
+  myBinStream.reset();
 }
 
 int StudyData_Object::getTick() const
 {
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
   return myTick;
 }
 
 void StudyData_Object::setTick(const int theValue)
 {
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
   myTick = theValue;
 }
 
 void StudyData_Object::SetShapeByPointer(const long long theShape)
 {
-  myOldShape = myShape;
-  myShape = *((TopoDS_Shape*)theShape);
-  std::ostringstream aStreamBrep;
-  if (!myShape.IsNull()) {
-    BRepTools::Write(myShape, aStreamBrep);
+  // shape of another object: its streams and computed sub-shapes are shared, not recomputed;
+  // they are copied before locking this object, so two objects are never locked at once
+  TopoDS_Shape aShape;
+  StudyData_ShapesMap aSubShapes[TopAbs_SHAPE + 1];
+  StudyData_ShapesList aSortedSubShapes[TopAbs_SHAPE + 2];
+  StudyData_BlobPtr aStream;
+  StudyData_BinaryPtr aBinStream;
+  StudyData_ObjectPtr anObj = find(theShape);
+  bool isOther = anObj && anObj.get() != this;
+  if (isOther) {
+    std::lock_guard<std::recursive_mutex> anObjLock(anObj->myMutex);
+    anObj->readShape();
+    aShape = anObj->myShape;
+    for(int aType = 0; aType <= TopAbs_SHAPE; aType++)
+      aSubShapes[aType] = anObj->mySubShapes[aType];
+    for(int aType = 0; aType <= TopAbs_SHAPE + 1; aType++)
+      aSortedSubShapes[aType] = anObj->mySortedSubShapes[aType];
+    aStream = anObj->myStream;
+    aBinStream = anObj->myBinStream;
   }
+
+  std::lock_guard<std::recursive_mutex> aLock(myMutex);
+  readShape();
+  // the current shape becomes the old one, text streams are generated on demand only
   myOldStream = myStream;
-  myStream = aStreamBrep.str();
+  myOldShape = myShape;
+  myOldBinStream = myBinStream;
   myTick++;
+  if (isOther) {
+    myShape = aShape;
+    for(int aType = 0; aType <= TopAbs_SHAPE; aType++)
+      mySubShapes[aType] = aSubShapes[aType];
+    for(int aType = 0; aType <= TopAbs_SHAPE + 1; aType++)
+      mySortedSubShapes[aType] = aSortedSubShapes[aType];
+    myStream = aStream;
+    myBinStream = aBinStream;
+    return;
+  }
+  myShape = shapeOf(theShape); // not an object shape or the shape of this object
+  clearSubShapes();
+  myStream.reset();
+  myBinStream.reset();
 }
 
-long long StudyData_Object::groupShape(long long theMainShape, const std::list<long> theSelection)
+void StudyData_Object::SetShapeByOldShape(const StudyData_Object& theObject)
 {
-  if (myShape.IsNull()) { // compute the cashed shape
-    TopoDS_Shape* aShape = (TopoDS_Shape*)theMainShape;
-    TopTools_IndexedMapOfShape anIndices;
-    TopExp::MapShapes(*aShape, anIndices);
+  TopoDS_Shape aShape;
+  StudyData_BlobPtr aStream;
+  StudyData_BinaryPtr aBinStream;
+  {
+    std::lock_guard<std::recursive_mutex> anObjLock(theObject.myMutex);
+    if (!theObject.myOldShape.IsNull() || theObject.myOldStream || theObject.myOldBinStream) {
+      aShape = theObject.myOldShape;
+      aStream = theObject.myOldStream;
+      aBinStream = theObject.myOldBinStream;
+    } else { // no old shape, so the current one is used, as in oldShapeStream
+      aShape = theObject.myShape;
+      aStream = theObject.myStream;
+      aBinStream = theObject.myBinStream;
+    }
+  }
+  std::lock_guard<std::recursive_mutex> anObjLock(myMutex);
+  myBinStream = aBinStream; // if not read yet, it is read on demand by this object
+  myOldBinStream.reset();
+  myShape = aShape;
+  myOldShape.Nullify();
+  clearSubShapes();
+  myStream = aStream;
+  myOldStream.reset();
+  myTick = 1;
+}
 
-    TopoDS_Compound aResult;
-    BRep_Builder aBuilder;
-    aBuilder.MakeCompound(aResult);
+long long StudyData_Object::groupShape(long long theMainShape, const std::list<long> theSelection)
+{
+  // the main shape object is locked only while this one is not locked, so two objects
+  // are never locked at once
+  TopoDS_Shape aMainShape = shapeOf(theMainShape);
+  std::unique_lock<std::recursive_mutex> aLock(myMutex);
+  // the same main shape object keeps the same sub-shapes indices
+  if (!myShape.IsNull() && myGroupMainShape.IsEqual(aMainShape) &&
+      myGroupSelection.size() == theSelection.size() &&
+      std::equal(theSelection.cbegin(), theSelection.cend(), myGroupSelection.cbegin()))
+    return (long long)(&myShape); // nothing is changed
+  aLock.unlock();
+  StudyData_ShapesMap anIndices = subShapes(theMainShape);
+  aLock.lock();
+  bool isSameMain = !myShape.IsNull() && myGroupMainShape.IsEqual(aMainShape);
 
-    std::list<long>::const_iterator aSelIter = theSelection.cbegin();
-    for(; aSelIter != theSelection.cend(); aSelIter++) {
-      TopoDS_Shape aSel = anIndices.FindKey(*aSelIter);
-      aBuilder.Add(aResult, aSel);
-    }
-    myShape = aResult;
-  } else { // check myShape equals to the new result
-    TopoDS_Shape* aShape = (TopoDS_Shape*)theMainShape;
-    TopTools_IndexedMapOfShape anIndices;
-    TopExp::MapShapes(*aShape, anIndices);
+  // always a new compound: the old one may be used outside (e.g. in SMESH)
+  TopoDS_Compound aResult;
+  BRep_Builder aBuilder;
+  aBuilder.MakeCompound(aResult);
+  std::list<long>::const_iterator aSelIter = theSelection.cbegin();
+  if (isSameMain) { // keep sub-shapes of the old compound which are not removed
+    std::set<long> aNewSelection(theSelection.cbegin(), theSelection.cend());
     TopoDS_Iterator aMyIter(myShape);
-    std::list<long>::const_iterator aSelIter = theSelection.cbegin();
-    for(; aSelIter != theSelection.cend() && aMyIter.More(); aSelIter++, aMyIter.Next()) {
-      TopoDS_Shape aSel = anIndices.FindKey(*aSelIter);
-      if (!aSel.IsSame(aMyIter.Value()))
-        break;
+    std::vector<long>::const_iterator anOldIter = myGroupSelection.cbegin();
+    for(; anOldIter != myGroupSelection.cend() && aMyIter.More(); anOldIter++, aMyIter.Next()) {
+      if (aNewSelection.find(*anOldIter) == aNewSelection.end())
+        continue; // removed
+      if (aSelIter == theSelection.cend() || *aSelIter != *anOldIter)
+        break; // order is changed
+      aBuilder.Add(aResult, aMyIter.Value());
+      aSelIter++;
     }
-    if (aMyIter.More() || aSelIter != theSelection.cend()) { // recompute myShape
-      TopoDS_Compound aResult;
-      BRep_Builder aBuilder;
+    if (anOldIter != myGroupSelection.cend()) { // order is changed, compute all from scratch
       aBuilder.MakeCompound(aResult);
-      std::list<long>::const_iterator aSelIter = theSelection.cbegin();
-      for(; aSelIter != theSelection.cend(); aSelIter++) {
-        TopoDS_Shape aSel = anIndices.FindKey(*aSelIter);
-        aBuilder.Add(aResult, aSel);
-      }
-      myShape = aResult;
+      aSelIter = theSelection.cbegin();
     }
   }
+  // add new sub-shapes
+  for(; aSelIter != theSelection.cend(); aSelIter++) {
+    aBuilder.Add(aResult, anIndices->FindKey(*aSelIter));
+  }
+  myShape = aResult;
+  clearSubShapes();
+  myBinStream.reset();
+  myGroupMainShape = aMainShape;
+  myGroupSelection.assign(theSelection.cbegin(), theSelection.cend());
   return (long long)(&myShape);
 }
+
+void StudyData_Object::SetReadThreads(const int theNumber)
+{
+  MY_READ_THREADS = theNumber;
+}
+
+int StudyData_Object::ReadThreads()
+{
+  if (MY_READ_THREADS >= 0)
+    return MY_READ_THREADS;
+  int aCores = (int)std::thread::hardware_concurrency();
+  return aCores > 0 ? aCores : 1;
+}
+
+void StudyData_Object::ReadShapes()
+{
+  int aThreads = ReadThreads();
+  if (aThreads == 0)
+    return;
+  // collect streams not read yet, objects having the same (interned) stream share the read shape
+  // (objects are kept by addresses of their shapes and found again to be sure they exist)
+  std::list<long long> aKeys;
+  {
+    std::lock_guard<std::mutex> aLock(MY_OBJECTS_MUTEX);
+    std::map<const TopoDS_Shape*, const StudyData_Object*>::const_iterator anObj =
+      MY_OBJECTS.cbegin();
+    for(; anObj != MY_OBJECTS.cend(); anObj++)
+      aKeys.push_back((long long)(anObj->first));
+  }
+  std::vector<StudyData_BinaryPtr> aStreams;
+  std::vector<std::list<long long> > anObjects;
+  std::unordered_map<const StudyData_Binary*, size_t> anIndices;
+  std::list<long long>::const_iterator aKey = aKeys.cbegin();
+  for(; aKey != aKeys.cend(); aKey++) {
+    StudyData_ObjectPtr anObj = find(*aKey);
+    if (!anObj)
+      continue; // deleted meanwhile
+    StudyData_BinaryPtr aStream;
+    {
+      std::lock_guard<std::recursive_mutex> anObjLock(anObj->myMutex);
+      if (!anObj->myBinStream || !anObj->myShape.IsNull())
+        continue; // no stream or already read
+      aStream = anObj->myBinStream;
+    }
+    std::unordered_map<const StudyData_Binary*, size_t>::iterator anIndex =
+      anIndices.find(aStream.get());
+    if (anIndex == anIndices.end()) {
+      anIndex = anIndices.insert(std::make_pair(aStream.get(), aStreams.size())).first;
+      aStreams.push_back(aStream);
+      anObjects.push_back(std::list<long long>());
+    }
+    anObjects[anIndex->second].push_back(*aKey);
+  }
+  if (aStreams.empty())
+    return;
+
+  // read shapes by threads, each takes the next not read stream; streams are shared,
+  // so they are kept even if objects are changed or deleted meanwhile
+  std::vector<TopoDS_Shape> aShapes(aStreams.size());
+  std::vector<char> isRead(aStreams.size(), 0);
+  std::atomic<size_t> aNext(0);
+  auto aReader = [&]() {
+    for(size_t anIndex = aNext++; anIndex < aStreams.size(); anIndex = aNext++) {
+      try {
+        aShapes[anIndex] = ReadBinary(*aStreams[anIndex]);
+        isRead[anIndex] = 1;
+      }
+      catch (Standard_Failure&) {} // left for reading on demand, reports the error there
+      catch (std::exception&) {}
+    }
+  };
+  if (aThreads > (int)aStreams.size())
+    aThreads = (int)aStreams.size();
+  std::vector<std::thread> aPool;
+  for(int aThread = 1; aThread < aThreads; aThread++)
+    aPool.push_back(std::thread(aReader));
+  aReader(); // the current thread reads too
+  for(size_t aThread = 0; aThread < aPool.size(); aThread++)
+    aPool[aThread].join();
+
+  // set shapes to objects that still exist and have the same streams
+  for(size_t anIndex = 0; anIndex < aStreams.size(); anIndex++) {
+    if (!isRead[anIndex])
+      continue;
+    std::list<long long>::const_iterator aKey = anObjects[anIndex].cbegin();
+    for(; aKey != anObjects[anIndex].cend(); aKey++) {
+      StudyData_ObjectPtr anObj = find(*aKey);
+      if (!anObj)
+        continue;
+      std::lock_guard<std::recursive_mutex> anObjLock(anObj->myMutex);
+      if (!anObj->myShape.IsNull() || anObj->myBinStream != aStreams[anIndex])
+        continue;
+      // maps of sub-shapes are computed after reading only, so they are empty here
+      anObj->myShape = aShapes[anIndex];
+    }
+  }
+}
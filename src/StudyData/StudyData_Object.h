@@ -18,6 +18,7 @@
 //
 
 #ifndef StudyData_Object_H
+#define StudyData_Object_H
 
 #include "StudyData.h"
 
@@ -25,19 +26,50 @@
 #include CORBA_SERVER_HEADER(GEOM_Gen)
 
 #include <TopoDS_Shape.hxx>
+#include <TopTools_IndexedMapOfShape.hxx>
+#include <TopTools_ListOfShape.hxx>
 #include <list>
+#include <vector>
+#include <memory>
+#include <mutex>
+
+/// Version of a shape (BRep text stream and the shape read from it) shared by objects
+struct StudyData_Blob;
+typedef std::shared_ptr<StudyData_Blob> StudyData_BlobPtr;
+
+/// Binary stream of a shape, shared by objects having the same shape version
+typedef std::shared_ptr<const StudyData_Binary> StudyData_BinaryPtr;
+
+/// Map of sub-shapes, kept alive while it is used even if the cache is cleared
+typedef std::shared_ptr<const TopTools_IndexedMapOfShape> StudyData_ShapesMap;
+/// List of sub-shapes, kept alive while it is used even if the cache is cleared
+typedef std::shared_ptr<const TopTools_ListOfShape> StudyData_ShapesList;
+
+class StudyData_Object;
+/// Object found by its shape, it is not destroyed while it is held
+typedef std::shared_ptr<const StudyData_Object> StudyData_ObjectPtr;
 
 class StudyData_EXPORT StudyData_Object
 {
 public:
   StudyData_Object(const std::string theFile);
   StudyData_Object();
+  ~StudyData_Object();
 
   int type() const;
 
   std::string shapeStream() const;
   std::string oldShapeStream() const;
 
+  // returns the current shape in OCCT binary BRep format
+  StudyData_Binary shapeBinStream() const;
+  // returns the old shape in OCCT binary BRep format, empty if there is no old shape
+  StudyData_Binary oldShapeBinStream() const;
+
+  // sets the current and the old shapes by streams in OCCT binary BRep format;
+  // streams are kept as they are and read only when the shape is needed
+  void SetShapeByBinStream(const StudyData_Binary& theStream, const StudyData_Binary& theOldStream);
+
   // returns the stored shape
   long long shape() const;
 
@@ -53,13 +85,82 @@ public:
   // sets the shape by the pointer to the TopoDS_Shape
   void SetShapeByPointer(const long long theShape);
 
+  // sets the shape as the old shape of theObject (the current one if there is no old shape);
+  // the shape and its streams are shared with theObject, not copied or re-read
+  void SetShapeByOldShape(const StudyData_Object& theObject);
+
   // returns the group shape related to the current selection in the group
   long long groupShape(long long theMainShape, const std::list<long> theSelection);
 
+  // sets the number of threads reading shapes in ReadShapes: zero (default) disables the reading
+  // (shapes are read on demand only), a negative value means the number of processor cores
+  static void SetReadThreads(const int theNumber);
+
+  // returns the number of threads reading shapes in ReadShapes
+  static int ReadThreads();
+
+  // reads current shapes of all objects set by binary streams and not read yet in parallel;
+  // the same streams are read once, old shapes are still read on demand
+  static void ReadShapes();
+
 private:
-  std::string myStream, myOldStream; // the current and old stream of a shape
-  TopoDS_Shape myShape, myOldShape; // latest shape of this object and the old one
+  friend class StudyData_Operation;
+
+  // the object is registered by the address of its shape, so it can not be copied
+  StudyData_Object(const StudyData_Object&);
+  StudyData_Object& operator=(const StudyData_Object&);
+
+  // returns the map of sub-shapes of theShape (of theType or of all types if it is TopAbs_SHAPE);
+  // if theShape is the shape of some object, the map is cached in this object
+  static StudyData_ShapesMap subShapes(const long long theShape, const int theType = TopAbs_SHAPE);
+
+  // returns the cached list of sub-shapes of theShape of theType sorted by coordinates,
+  // null if it is not computed yet or theShape is not the shape of some object
+  static StudyData_ShapesList sortedSubShapes(const long long theShape, const int theType);
+
+  // caches theList of sorted sub-shapes of theType if theShape is the shape of some object
+  // and this shape is still theCurrent the list was computed for
+  static void setSortedSubShapes(const long long theShape, const TopoDS_Shape& theCurrent,
+    const int theType, const StudyData_ShapesList& theList);
+
+  // returns a copy of the shape by the pointer; the current shape of an object is read if
+  // needed and copied under the lock of the object, so it may be used in parallel with changes
+  static TopoDS_Shape shapeOf(const long long theShape);
+
+  // returns the object having theShape as the current shape, null if there is no such object;
+  // the object is not destroyed (its destructor waits) till the returned pointer is released
+  static StudyData_ObjectPtr find(const long long theShape);
+
+  // clears the cached maps of sub-shapes, must be called on each change of the current shape
+  void clearSubShapes() const;
+
+  // returns the current stream of a shape, generates it if the shape was set in binary format or by pointer
+  const std::string& textStream() const;
+
+  // reads the current shape from the binary stream if it is not read yet
+  void readShape() const;
+  // reads the old shape from the binary stream if it is not read yet
+  void readOldShape() const;
+
+  // the current and old versions of a shape with streams, null if not generated yet
+  mutable StudyData_BlobPtr myStream, myOldStream;
+  // latest shape of this object and the old one
+  mutable TopoDS_Shape myShape, myOldShape;
+  // binary streams of the current and old shapes, null if not known yet; a shape is read from
+  // the stream on demand if it is null, the stream is kept to store the same shape without writing
+  mutable StudyData_BinaryPtr myBinStream, myOldBinStream;
   int myTick; // version index of the shape
+  // cached maps of sub-shapes of the current shape: by types and of all types (TopAbs_SHAPE)
+  mutable StudyData_ShapesMap mySubShapes[TopAbs_SHAPE + 1];
+  // cached sorted lists of sub-shapes of the current shape by explode types (including flat)
+  mutable StudyData_ShapesList mySortedSubShapes[TopAbs_SHAPE + 2];
+  // locks the object state: methods may be called in parallel since they release the GIL
+  mutable std::recursive_mutex myMutex;
+  // number of pointers returned by find and not released yet, protected by the objects registry
+  mutable int myUsers;
+  // for a group: main shape and selection the current group shape is computed for
+  TopoDS_Shape myGroupMainShape;
+  std::vector<long> myGroupSelection;
 };
 
 #endif // !StudyData_Object_H
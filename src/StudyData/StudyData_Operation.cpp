@@ -18,6 +18,7 @@
 //
 
 #include "StudyData_Operation.h"
+#include "StudyData_Object.h"
 
 #include <Precision.hxx>
 #include <TopoDS.hxx>
@@ -170,18 +171,25 @@ static void SortShapes (TopTools_ListOfShape& SL)
 }
 
 
-std::list<long> StudyData_Operation::GetAllSubShapesIDs(
+StudyData_ShapesList StudyData_Operation::SubShapesList(
   const long long theShape, const int theShapeType, const bool isSorted)
 {
-  TopoDS_Shape* aShape = (TopoDS_Shape*)theShape;
+  if (isSorted) { // sorting is long, so it is done once for the shape version
+    StudyData_ShapesList aCached = StudyData_Object::sortedSubShapes(theShape, theShapeType);
+    if (aCached)
+      return aCached;
+  }
+  TopoDS_Shape aShape = StudyData_Object::shapeOf(theShape);
 
-  std::list<long> aResult;
+  std::shared_ptr<TopTools_ListOfShape> aList(new TopTools_ListOfShape);
+  if (aShape.IsNull())
+    return aList;
+  TopTools_ListOfShape& listShape = *aList;
   TopTools_MapOfShape mapShape;
-  TopTools_ListOfShape listShape;
 
-  if (aShape->ShapeType() == TopAbs_COMPOUND &&
+  if (aShape.ShapeType() == TopAbs_COMPOUND &&
     (theShapeType == TopAbs_SHAPE || theShapeType == TopAbs_FLAT || theShapeType == TopAbs_COMPOUND)) {
-    TopoDS_Iterator It (*aShape, Standard_True, Standard_True);
+    TopoDS_Iterator It (aShape, Standard_True, Standard_True);
     for (; It.More(); It.Next()) {
       TopoDS_Shape SS = It.Value();
       if (mapShape.Add(SS)) {
@@ -193,27 +201,34 @@ std::list<long> StudyData_Operation::GetAllSubShapesIDs(
       }
     }
   } else {
-    TopExp_Explorer exp (*aShape, TopAbs_ShapeEnum(theShapeType));
+    TopExp_Explorer exp (aShape, TopAbs_ShapeEnum(theShapeType));
     for (; exp.More(); exp.Next())
       if (mapShape.Add(exp.Current()))
         listShape.Append(exp.Current());
   }
 
-  if (listShape.IsEmpty()) {
-    return aResult;
-  }
-
   if (isSorted) {
     SortShapes(listShape);
+    StudyData_Object::setSortedSubShapes(theShape, aShape, theShapeType, aList);
+  }
+  return aList;
+}
+
+std::list<long> StudyData_Operation::GetAllSubShapesIDs(
+  const long long theShape, const int theShapeType, const bool isSorted)
+{
+  std::list<long> aResult;
+  StudyData_ShapesList listShape = SubShapesList(theShape, theShapeType, isSorted);
+  if (listShape->IsEmpty()) {
+    return aResult;
   }
 
-  TopTools_IndexedMapOfShape anIndices;
-  TopExp::MapShapes(*aShape, anIndices);
+  StudyData_ShapesMap anIndices = StudyData_Object::subShapes(theShape);
 
-  TopTools_ListIteratorOfListOfShape itSub (listShape);
+  TopTools_ListIteratorOfListOfShape itSub (*listShape);
   for (int index = 1; itSub.More(); itSub.Next(), ++index) {
     TopoDS_Shape aValue = itSub.Value();
-    aResult.push_back(anIndices.FindIndex(aValue));
+    aResult.push_back(anIndices->FindIndex(aValue));
   }
 
   return aResult;
@@ -224,21 +239,16 @@ std::list<long long> StudyData_Operation::GetSharedShapes(
 {
   std::list<long long> aResult;
 
-  TopoDS_Shape* aShape1 = (TopoDS_Shape*)theShape1;
-  TopoDS_Shape* aShape2 = (TopoDS_Shape*)theShape2;
-  if (aShape1->IsNull() || aShape2->IsNull())
+  TopoDS_Shape aShape1 = StudyData_Object::shapeOf(theShape1);
+  TopoDS_Shape aShape2 = StudyData_Object::shapeOf(theShape2);
+  if (aShape1.IsNull() || aShape2.IsNull())
     return aResult;
-  TopTools_IndexedMapOfShape anIndices;
-  TopExp::MapShapes(*aShape1, anIndices);
-  Handle(TColStd_HArray1OfInteger) anArray;
-
-  TopTools_IndexedMapOfShape mapShape1;
-  TopExp::MapShapes(*aShape1, TopAbs_ShapeEnum(theShapeType), mapShape1);
+  StudyData_ShapesMap mapShape1 = StudyData_Object::subShapes(theShape1, theShapeType);
   TopTools_MapOfShape mapShape2;
-  TopExp_Explorer exp (*aShape2, TopAbs_ShapeEnum(theShapeType));
+  TopExp_Explorer exp (aShape2, TopAbs_ShapeEnum(theShapeType));
   for (; exp.More(); exp.Next()) {
     TopoDS_Shape aSS = exp.Current();
-    if (mapShape2.Add(aSS) && mapShape1.Contains(aSS)) {
+    if (mapShape2.Add(aSS) && mapShape1->Contains(aSS)) {
       // for the current moment there are no sub-shape managed in the SHAPER-STUDY, so,
       // store just shape in heap and return pointer to it (otherwise it will be disappeared)
       long long aNewShapePointer = (long long)(new TopoDS_Shape(aSS));
@@ -251,86 +261,79 @@ std::list<long long> StudyData_Operation::GetSharedShapes(
 
 int StudyData_Operation::GetSubShapeIndex(const long long theMainShape, const long long theSubShape)
 {
-  TopoDS_Shape* aMainShape = (TopoDS_Shape*)theMainShape;
-  TopoDS_Shape* aSubShape = (TopoDS_Shape*)theSubShape;
-  if ( !aMainShape || !aSubShape || aMainShape->IsNull() || aSubShape->IsNull())
+  TopoDS_Shape aMainShape = StudyData_Object::shapeOf(theMainShape);
+  TopoDS_Shape aSubShape = StudyData_Object::shapeOf(theSubShape);
+  if ( aMainShape.IsNull() || aSubShape.IsNull())
     return 0;
 
-  TopTools_IndexedMapOfShape anIndices;
-  TopExp::MapShapes(*aMainShape, anIndices);
-  return anIndices.FindIndex(*aSubShape);
+  return StudyData_Object::subShapes(theMainShape)->FindIndex(aSubShape);
+}
+
+std::list<long> StudyData_Operation::GetSubShapeIndices(const long long theMainShape,
+                                                        const std::list<long long> theSubShapes)
+{
+  std::list<long> aResult;
+  TopoDS_Shape aMainShape = StudyData_Object::shapeOf(theMainShape);
+  if ( aMainShape.IsNull()) {
+    aResult.resize(theSubShapes.size(), 0);
+    return aResult;
+  }
+  StudyData_ShapesMap anIndices = StudyData_Object::subShapes(theMainShape);
+  std::list<long long>::const_iterator aSubIter = theSubShapes.cbegin();
+  for(; aSubIter != theSubShapes.cend(); aSubIter++) {
+    TopoDS_Shape aSubShape = StudyData_Object::shapeOf(*aSubIter);
+    if ( aSubShape.IsNull())
+      aResult.push_back(0);
+    else
+      aResult.push_back(anIndices->FindIndex(aSubShape));
+  }
+  return aResult;
 }
 
 int StudyData_Operation::GetTopologyIndex(const long long theMainShape, const long long theSubShape)
 {
-  TopoDS_Shape* aMainShape = (TopoDS_Shape*)theMainShape;
-  TopoDS_Shape* aSubShape = (TopoDS_Shape*)theSubShape;
-  if ( !aMainShape || !aSubShape || aMainShape->IsNull() || aSubShape->IsNull())
+  TopoDS_Shape aMainShape = StudyData_Object::shapeOf(theMainShape);
+  TopoDS_Shape aSubShape = StudyData_Object::shapeOf(theSubShape);
+  if ( aMainShape.IsNull() || aSubShape.IsNull())
     return 0;
 
-  TopTools_IndexedMapOfShape anIndices;
-  TopExp::MapShapes(*aMainShape, aSubShape->ShapeType(), anIndices);
-  return anIndices.FindIndex(*aSubShape);
+  return StudyData_Object::subShapes(theMainShape, aSubShape.ShapeType())->FindIndex(aSubShape);
 }
 
 long long StudyData_Operation::GetSubShape(const long long theMainShape, long theID)
 {
-  TopoDS_Shape* aMainShape = (TopoDS_Shape*)theMainShape;
-  if (aMainShape->IsNull())
+  TopoDS_Shape aMainShape = StudyData_Object::shapeOf(theMainShape);
+  if (aMainShape.IsNull())
     return 0;
-  TopTools_IndexedMapOfShape anIndices;
-  TopExp::MapShapes(*aMainShape, anIndices);
-  if (anIndices.Size() < theID)
+  StudyData_ShapesMap anIndices = StudyData_Object::subShapes(theMainShape);
+  if (anIndices->Size() < theID)
     return 0;
-  const TopoDS_Shape& aFound = anIndices.FindKey(theID);
+  const TopoDS_Shape& aFound = anIndices->FindKey(theID);
   // for the current moment there are no sub-shape managed in the SHAPER-STUDY, so,
   // store just shape in heap and return pointer to it (otherwise it will be disappeared)
   return (long long)(new TopoDS_Shape(aFound));
 }
 
+int StudyData_Operation::NumberOfSubShapes(const long long theMainShape)
+{
+  if (StudyData_Object::shapeOf(theMainShape).IsNull())
+    return 0;
+  return StudyData_Object::subShapes(theMainShape)->Extent();
+}
+
 std::list<long long> StudyData_Operation::ExtractSubShapes(const long long theMainShape,
                                                            const int       theShapeType,
                                                            const bool      theIsSorted)
 {
   std::list<long long> resultList;
 
-  TopoDS_Shape* aShape = (TopoDS_Shape*)theMainShape;
-  if ( !aShape || aShape->IsNull())
-    return resultList;
-
-  std::list<long> aResult;
-  TopTools_MapOfShape mapShape;
-  TopTools_ListOfShape listShape;
-
-  if (aShape->ShapeType() == TopAbs_COMPOUND &&
-    (theShapeType == TopAbs_SHAPE || theShapeType == TopAbs_FLAT || theShapeType == TopAbs_COMPOUND)) {
-    TopoDS_Iterator It (*aShape, Standard_True, Standard_True);
-    for (; It.More(); It.Next()) {
-      TopoDS_Shape SS = It.Value();
-      if (mapShape.Add(SS)) {
-        if (theShapeType == TopAbs_FLAT) {
-          AddFlatSubShapes(SS, listShape, mapShape);
-        } else if (theShapeType == TopAbs_SHAPE || theShapeType == SS.ShapeType()) {
-          listShape.Append(SS);
-        }
-      }
-    }
-  } else {
-    TopExp_Explorer exp (*aShape, TopAbs_ShapeEnum(theShapeType));
-    for (; exp.More(); exp.Next())
-      if (mapShape.Add(exp.Current()))
-        listShape.Append(exp.Current());
-  }
-
-  if (listShape.IsEmpty()) {
+  TopoDS_Shape aShape = StudyData_Object::shapeOf(theMainShape);
+  if ( aShape.IsNull())
     return resultList;
-  }
 
-  if (theIsSorted) {
-    SortShapes(listShape);
-  }
+  StudyData_ShapesList listShape = SubShapesList(theMainShape, theShapeType, theIsSorted);
 
-  TopTools_ListIteratorOfListOfShape itSub (listShape);
+  TopTools_ListIteratorOfListOfShape itSub (*listShape);
   for ( ; itSub.More(); itSub.Next() ) {
     TopoDS_Shape aValue = itSub.Value();
     resultList.push_back( (long long)(new TopoDS_Shape(aValue)) );
@@ -343,11 +346,11 @@ std::list<double> StudyData_Operation::PointCoordinates(const long long theVerte
 {
   std::list<double> xyz;
 
-  TopoDS_Shape* aShape = (TopoDS_Shape*)theVertex;
-  if ( !aShape || aShape->IsNull() || aShape->ShapeType() != TopAbs_VERTEX )
+  TopoDS_Shape aShape = StudyData_Object::shapeOf(theVertex);
+  if ( aShape.IsNull() || aShape.ShapeType() != TopAbs_VERTEX )
     return xyz;
 
-  gp_Pnt p = BRep_Tool::Pnt( TopoDS::Vertex( *aShape ));
+  gp_Pnt p = BRep_Tool::Pnt( TopoDS::Vertex( aShape ));
   xyz.push_back( p.X() );
   xyz.push_back( p.Y() );
   xyz.push_back( p.Z() );
@@ -358,15 +361,15 @@ std::list<double> StudyData_Operation::PointCoordinates(const long long theVerte
 double StudyData_Operation::MinDistance(const long long theVertex1, const long long theVertex2)
 {
   double result = -1;
-  TopoDS_Shape* aShape1 = (TopoDS_Shape*)theVertex1;
-  TopoDS_Shape* aShape2 = (TopoDS_Shape*)theVertex2;
+  TopoDS_Shape aShape1 = StudyData_Object::shapeOf(theVertex1);
+  TopoDS_Shape aShape2 = StudyData_Object::shapeOf(theVertex2);
 
-  if ( !aShape1 || aShape1->IsNull() || aShape1->ShapeType() != TopAbs_VERTEX ||
-       !aShape2 || aShape2->IsNull() || aShape2->ShapeType() != TopAbs_VERTEX )
+  if ( aShape1.IsNull() || aShape1.ShapeType() != TopAbs_VERTEX ||
+       aShape2.IsNull() || aShape2.ShapeType() != TopAbs_VERTEX )
     return result;
 
-  gp_Pnt p1 = BRep_Tool::Pnt( TopoDS::Vertex( *aShape1 ));
-  gp_Pnt p2 = BRep_Tool::Pnt( TopoDS::Vertex( *aShape2 ));
+  gp_Pnt p1 = BRep_Tool::Pnt( TopoDS::Vertex( aShape1 ));
+  gp_Pnt p2 = BRep_Tool::Pnt( TopoDS::Vertex( aShape2 ));
 
   result = p1.Distance( p2 );
   return result;
@@ -376,13 +379,11 @@ int StudyData_Operation::NumberOfEdges(const long long theShape)
 {
   int nb = -1;
 
-  TopoDS_Shape* aShape = (TopoDS_Shape*)theShape;
-  if ( !aShape || aShape->IsNull() )
+  TopoDS_Shape aShape = StudyData_Object::shapeOf(theShape);
+  if ( aShape.IsNull() )
     return nb;
 
-  TopTools_IndexedMapOfShape anIndices;
-  TopExp::MapShapes(*aShape, TopAbs_EDGE, anIndices);
-  nb = anIndices.Extent();
+  nb = StudyData_Object::subShapes(theShape, TopAbs_EDGE)->Extent();
 
   return nb;
 }
@@ -391,13 +392,11 @@ int StudyData_Operation::NumberOfFaces(const long long theShape)
 {
   int nb = -1;
 
-  TopoDS_Shape* aShape = (TopoDS_Shape*)theShape;
-  if ( !aShape || aShape->IsNull() )
+  TopoDS_Shape aShape = StudyData_Object::shapeOf(theShape);
+  if ( aShape.IsNull() )
     return nb;
 
-  TopTools_IndexedMapOfShape anIndices;
-  TopExp::MapShapes(*aShape, TopAbs_FACE, anIndices);
-  nb = anIndices.Extent();
+  nb = StudyData_Object::subShapes(theShape, TopAbs_FACE)->Extent();
 
   return nb;
 }
@@ -406,11 +405,11 @@ double StudyData_Operation::GetTolerance( const long long theVertex )
 {
   double tol = -1;
 
-  TopoDS_Shape* aShape = (TopoDS_Shape*)theVertex;
-  if ( !aShape || aShape->IsNull() || aShape->ShapeType() != TopAbs_VERTEX )
+  TopoDS_Shape aShape = StudyData_Object::shapeOf(theVertex);
+  if ( aShape.IsNull() || aShape.ShapeType() != TopAbs_VERTEX )
     return tol;
 
-  tol = BRep_Tool::Tolerance( TopoDS::Vertex( *aShape ));
+  tol = BRep_Tool::Tolerance( TopoDS::Vertex( aShape ));
 
   return tol;
 }
@@ -419,18 +418,18 @@ long long StudyData_Operation::GetVertexByIndex(const long long theEdge,
                                                 int             theIndex,
                                                 bool            theUseOri )
 {
-  TopoDS_Shape* aShape = (TopoDS_Shape*)theEdge;
-  if ( !aShape || aShape->IsNull() || aShape->ShapeType() != TopAbs_EDGE )
+  TopoDS_Shape aShape = StudyData_Object::shapeOf(theEdge);
+  if ( aShape.IsNull() || aShape.ShapeType() != TopAbs_EDGE )
     return 0;
 
   if ( !theUseOri )
-    aShape->Orientation( TopAbs_FORWARD );
+    aShape.Orientation( TopAbs_FORWARD );
 
   TopoDS_Vertex aVertex;
   if ( theIndex == 0 )
-    aVertex = TopExp::FirstVertex( TopoDS::Edge( *aShape ));
+    aVertex = TopExp::FirstVertex( TopoDS::Edge( aShape ));
   else
-    aVertex = TopExp::LastVertex( TopoDS::Edge( *aShape ));
+    aVertex = TopExp::LastVertex( TopoDS::Edge( aShape ));
 
   return (long long)(new TopoDS_Shape( aVertex ));
 }
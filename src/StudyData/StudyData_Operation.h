@@ -18,8 +18,10 @@
 //
 
 #ifndef StudyData_Operation_H
+#define StudyData_Operation_H
 
 #include "StudyData.h"
+#include "StudyData_Object.h"
 
 #include <list>
 
@@ -43,9 +45,16 @@ public:
   /// Returns zero if there is no such sub-shape in the main shape.
   int GetSubShapeIndex(const long long theMainShape, const long long theSubShape);
 
+  /// Returns indices of theSubShapes in theMainShape, zero for not found ones.
+  std::list<long> GetSubShapeIndices(const long long theMainShape,
+                                     const std::list<long long> theSubShapes);
+
   /// Get a sub-shape defined by its unique ID within theMainShape.
   long long GetSubShape(const long long theMainShape, long theID);
 
+  /// Returns the number of sub-shapes of all types in theMainShape: valid IDs are from 1 to it.
+  int NumberOfSubShapes(const long long theMainShape);
+
   // Extract shapes of given type
   std::list<long long> ExtractSubShapes(const long long theMainShape,
                                         const int       theShapeType,
@@ -64,6 +73,12 @@ public:
   double GetTolerance( const long long theShape);
 
   long long GetVertexByIndex(const long long theEdge, int theIndex, bool theUseOri );
+
+private:
+  /// Explode a shape on sub-shapes of a given type, sorted by coordinates if isSorted is true.
+  /// Sorted sub-shapes of an object shape are cached till the shape is changed.
+  static StudyData_ShapesList SubShapesList(
+    const long long theShape, const int theShapeType, const bool isSorted);
 };
 
 #endif // !StudyData_Operation_H
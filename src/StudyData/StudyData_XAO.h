@@ -17,7 +17,8 @@
 // See http://www.salome-platform.org/ or email : webmaster.salome@opencascade.com
 //
 
-#ifndef StudyData_Object_H
+#ifndef StudyData_XAO_H
+#define StudyData_XAO_H
 
 #include "StudyData.h"
 #include <XAO_Xao.hxx>
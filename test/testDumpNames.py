@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+###
+### Unique names of variables in the python dump
+###
+
+from salome.kernel import salome
+salome.salome_init()
+
+from SHAPERSTUDY import uniqueDumpName, resetDumpNames
+
+resetDumpNames({})
+assert uniqueDumpName("Box 1", "0:1:1") == "Box_1"
+assert uniqueDumpName("Box_1", "0:1:2") == "Box_1_1"
+assert uniqueDumpName("Box (1)", "0:1:3") == "Box_1_2"
+assert uniqueDumpName("Group", "0:1:4") == "Group"
+assert uniqueDumpName("Group", "0:1:5") == "Group_1"
+
+# reset to the names known before: suffixes are searched again from the first one
+resetDumpNames({"0:1:1" : "Box_1", "0:1:3" : "Box_1_2"})
+assert uniqueDumpName("Box_1", "0:1:2") == "Box_1_1"
+assert uniqueDumpName("Box_1", "0:1:6") == "Box_1_3"
+assert uniqueDumpName("Group", "0:1:4") == "Group"
+
+# renamed entry frees its old name
+assert uniqueDumpName("Other", "0:1:1") == "Other"
+assert uniqueDumpName("Box_1", "0:1:7") == "Box_1"
+
+# reset to no names
+resetDumpNames({})
+assert uniqueDumpName("Box_1", "0:1:2") == "Box_1"
+assert uniqueDumpName("Group", "0:1:5") == "Group"
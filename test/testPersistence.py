@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+###
+### Binary persistence of the SHAPER-STUDY data: records written by Writer are read back by Reader
+###
+
+import array
+import io
+import os
+import tempfile
+
+import SHAPERSTUDY_Persistence as persistence
+
+def writeStudy(theSink, theDirectory = None):
+  aWriter = persistence.Writer(theSink, theDirectory, "SHAPERSTUDY_")
+  aWriter.AddShape("1", 3, b"shape v3", b"shape v2")
+  aWriter.AddShape("2", 1, b"shape v3", b"") # same version of another shape, no old one
+  aWriter.AddGroup("1:1", 6, [1, 3, 5], [1, 3])
+  aWriter.AddField("1:2", 4, 2, ["X", "Y"], [(1, 10, [0.5, 1.5]), (2, 20, array.array('d', [2.5, 3.5]))],
+                   [2], [])
+  aWriter.AddField("1:3", 7, 3, ["Name"], [(1, 0, ["", "café", "中文", ""])], [1, 2], [1])
+  aWriter.Close()
+
+def readStudy(theReader):
+  """
+  Returns contents of the records by kinds: {kind : {entry : data}}
+  """
+  aBlobs = {}
+  aRes = {persistence.BLOB : aBlobs}
+  for aKind, anEntry, anUnpacker in theReader.Records():
+    if aKind == persistence.BLOB:
+      aBlobs[anEntry] = bytes(persistence.readBlob(anUnpacker))
+    elif aKind == persistence.SHAPE:
+      aRes.setdefault(aKind, {})[anEntry] = persistence.readShape(anUnpacker, aBlobs)
+    elif aKind == persistence.GROUP:
+      aRes.setdefault(aKind, {})[anEntry] = persistence.readGroup(anUnpacker)
+    elif aKind == persistence.FIELD:
+      aRes.setdefault(aKind, {})[anEntry] = persistence.readField(anUnpacker)
+  return aRes
+
+def checkStudy(theReader):
+  aRecords = readStudy(theReader)
+  # the same shape content is written once
+  assert len(aRecords[persistence.BLOB]) == 2
+  aShapes = aRecords[persistence.SHAPE]
+  aTick, aStream, anOldStream = aShapes["1"]
+  assert aTick == 3 and bytes(aStream) == b"shape v3" and bytes(anOldStream) == b"shape v2"
+  aTick, aStream, anOldStream = aShapes["2"]
+  assert aTick == 1 and bytes(aStream) == b"shape v3" and len(anOldStream) == 0
+
+  aSelType, aSelection, aSelectionOld = aRecords[persistence.GROUP]["1:1"]
+  assert aSelType == 6 and list(aSelection) == [1, 3, 5] and list(aSelectionOld) == [1, 3]
+
+  aSelType, aValType, aComponents, aSteps, aSelection, aSelectionOld = \
+    aRecords[persistence.FIELD]["1:2"]
+  assert aSelType == 4 and aValType == 2 and aComponents == ["X", "Y"]
+  assert [(aStep, aStamp, list(aValues)) for aStep, aStamp, aValues in aSteps] == \
+         [(1, 10, [0.5, 1.5]), (2, 20, [2.5, 3.5])]
+  assert list(aSelection) == [2] and list(aSelectionOld) == []
+
+  aSelType, aValType, aComponents, aSteps, aSelection, aSelectionOld = \
+    aRecords[persistence.FIELD]["1:3"]
+  assert aValType == persistence.STRING_VALUES and aComponents == ["Name"]
+  assert aSteps[0][2].tolist() == ["", "café", "中文", ""]
+  assert list(aSelection) == [1, 2] and list(aSelectionOld) == [1]
+  return aRecords
+
+aSink = io.BytesIO()
+writeStudy(aSink)
+aStream = aSink.getvalue()
+assert persistence.isBinary(aStream)
+checkStudy(persistence.Reader(aStream))
+
+# multi-file mode: records are in separate files, the stream has the TOC only
+with tempfile.TemporaryDirectory() as aDir:
+  # files of a previous save having more records
+  for aFileName in ["SHAPERSTUDY_1.bin", "SHAPERSTUDY_99.bin", "other_1.bin"]:
+    with open(os.path.join(aDir, aFileName), "wb") as aFile:
+      aFile.write(b"old")
+  aSink = io.BytesIO()
+  writeStudy(aSink, aDir)
+  aReader = persistence.Reader(aSink.getvalue(), aDir)
+  assert len(aSink.getvalue()) < len(aStream)
+  assert sorted(os.listdir(aDir)) == sorted([aFileName for aKind, anEntry, aFileName, anOffset, aSize
+                                             in aReader.toc] + ["other_1.bin"])
+  checkStudy(aReader)
+
+# old text format and other versions are not read as the binary one
+assert not persistence.isBinary(b"1:0:0:0:0:0 ")
+aStream = bytearray(aStream)
+aStream[len(persistence.MAGIC)] += 1
+try:
+  persistence.Reader(aStream)
+  assert False, "unsupported version is read"
+except ValueError:
+  pass
+
+###
+### String values are packed into one UTF-8 blob
+###
+
+anEmpty = persistence.StringValues()
+assert len(anEmpty) == 0 and anEmpty.tolist() == [] and anEmpty.blob == b""
+
+aValues = persistence.StringValues(["", "été", "", "中", "end"])
+assert len(aValues) == 5
+assert aValues.tolist() == ["", "été", "", "中", "end"]
+assert aValues[0] == "" and aValues[-1] == "end"
+assert list(aValues.offsets) == [0, 0, 5, 5, 8, 11]
+assert aValues[1:4].tolist() == ["été", "", "中"]
+assert aValues[::2].tolist() == ["", "", "end"]
+assert aValues[4:1].tolist() == []
+try:
+  aValues[5]
+  assert False, "value out of range is returned"
+except IndexError:
+  pass
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+###
+### Selection of groups: union and difference keep the order and report no change by None,
+### invalid sub-shapes IDs do not change the group
+###
+
+from salome.kernel import salome
+salome.salome_init()
+
+from SHAPERSTUDY_Object import unionSelection, differenceSelection
+
+# union
+assert unionSelection([], [3, 1, 3]) == [3, 1]
+assert unionSelection([2, 4], [4, 1, 2, 1, 5]) == [2, 4, 1, 5]
+assert unionSelection([2, 4], [4, 2]) is None
+assert unionSelection([2, 4], []) is None
+assert unionSelection([], []) is None
+assert unionSelection((2, 4), [6], {2, 4}) == [2, 4, 6]
+
+# difference
+assert differenceSelection([5, 1, 3, 1], [1]) == [5, 3]
+assert differenceSelection([5, 1, 3], [3, 7, 5]) == [1]
+assert differenceSelection([5, 1, 3], [5, 1, 3]) == []
+assert differenceSelection([5, 1, 3], [7]) is None
+assert differenceSelection([5, 1, 3], []) is None
+assert differenceSelection([], [1]) is None
+assert differenceSelection((5, 1), [1], {5, 1}) == [5]
+
+# the given selection is not modified
+aSelection = [1, 2]
+unionSelection(aSelection, [3])
+differenceSelection(aSelection, [1])
+assert aSelection == [1, 2]
+
+###
+### Group of edges of a published face
+###
+
+from salome.shaper import model
+
+model.begin()
+partSet = model.moduleDocument()
+Part_1 = model.addPart(partSet)
+Part_1_doc = Part_1.document()
+Box_1 = model.addBox(Part_1_doc, 10, 10, 10)
+Face_1 = model.addFace(Part_1_doc, [model.selection("FACE", "Box_1_1/Top")])
+model.end()
+
+import SHAPERSTUDY
+
+model.begin()
+anExportFeature = Part_1_doc.addFeature("PublishToStudy")
+model.end()
+
+face = salome.myStudy.FindObjectByPath("/ShaperResults/Face_1_1").GetObject()
+
+import shaperBuilder
+shaper = shaperBuilder.New()
+aGroupOp = shaper.GetIGroupOperations()
+
+ee = shaper.ExtractShapes( face, shaper.ShapeType["EDGE"])
+eIDs = [shaper.GetSubShapeID( face, e ) for e in ee]
+eGroup = shaper.CreateGroup( face, shaper.ShapeType["EDGE"])
+eGroup.SetEntry("eGroup") # enable adding to study
+shaper.addToStudyInFather( face, eGroup, "eGroup" )
+
+aGroupOp.UnionIDs( eGroup, eIDs[:2] )
+assert aGroupOp.IsDone()
+assert list(aGroupOp.GetObjects( eGroup )) == eIDs[:2]
+
+# face, wire, 4 edges and 4 vertices are indexed in the face
+for anInvalid in [[0], [-1], [11], [eIDs[2], 11]]:
+  aGroupOp.UnionIDs( eGroup, anInvalid )
+  assert not aGroupOp.IsDone()
+  assert list(aGroupOp.GetObjects( eGroup )) == eIDs[:2]
+  aGroupOp.DifferenceIDs( eGroup, anInvalid )
+  assert not aGroupOp.IsDone()
+  assert list(aGroupOp.GetObjects( eGroup )) == eIDs[:2]
+
+aGroupOp.DifferenceIDs( eGroup, [eIDs[0]] )
+assert aGroupOp.IsDone()
+assert list(aGroupOp.GetObjects( eGroup )) == [eIDs[1]]